@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class TowerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'tower'
\ No newline at end of file
+    name = 'tower'
+
+    def ready(self):
+        # Registers the audit, table-version and token-revocation model signals
+        from . import audit, authentication, versioning  # noqa: F401
@@ -0,0 +1,462 @@
+"""Async views for the endpoints that wait on Ansible Tower.
+
+Under ASGI (uvicorn/daphne tower_admin.asgi:application) these suspend on the
+event loop while Tower answers instead of holding a worker thread for the whole
+round trip, so one worker keeps hundreds of slow Tower calls in flight. ASGI is
+required in production: under WSGI (runserver, tests) Django runs each request
+in its own event loop, so nothing is pooled across requests and streamed
+responses are buffered whole before they are sent.
+
+DRF's APIView is synchronous, so async_api_view() performs the parts of it these
+views need: authentication, permission checks and JSON body parsing, each of
+which may touch the DB and therefore runs through sync_to_async.
+"""
+import functools
+import json
+import logging
+import math
+
+import requests
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .models import TowerConfig, TowerInstance, TowerCredentialMirror, CredentialType, TowerCredentialTypeMirror
+from .sync import fresh_instance_ids, mirror_object
+from .tower_cache import invalidate_tower_cache
+from .tower_client import client_settings, get_async_client, get_async_client_for_url, async_fan_out, async_iter_fan_out
+
+
+logger = logging.getLogger(__name__)
+
+
+def async_api_view(methods, permission_classes=(IsAuthenticated,), throttle_classes=None):
+    """Decorator for async function views, the async counterpart of DRF's @api_view.
+
+    The view receives a DRF Request (request.data, request.query_params and
+    request.user are ready to use) and returns a Django HttpResponse.
+    throttle_classes defaults to DEFAULT_THROTTLE_CLASSES, as for DRF views.
+    """
+    allowed = [method.upper() for method in methods]
+
+    def initialize(request):
+        drf_request = Request(
+            request,
+            parsers=[JSONParser()],
+            authenticators=[cls() for cls in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+        )
+        try:
+            for permission in (cls() for cls in permission_classes):
+                if not permission.has_permission(drf_request, None):
+                    if drf_request.authenticators and not drf_request.successful_authenticator:
+                        raise exceptions.NotAuthenticated()
+                    raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+            # As APIView.check_throttles(): every throttle counts the request, the longest wait wins
+            throttles = throttle_classes if throttle_classes is not None else api_settings.DEFAULT_THROTTLE_CLASSES
+            waits = [throttle.wait() for throttle in (cls() for cls in throttles)
+                     if not throttle.allow_request(drf_request, None)]
+            if waits:
+                raise exceptions.Throttled(max((wait for wait in waits if wait is not None), default=None))
+            if drf_request.method in ('POST', 'PUT', 'PATCH'):
+                drf_request.data  # parse now; the body is not readable from the event loop later
+        except exceptions.APIException as e:
+            return drf_request, e
+        return drf_request, None
+
+    def decorator(view):
+        @csrf_exempt
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in allowed:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED,
+                    headers={'Allow': ', '.join(allowed)},
+                )
+            drf_request, error = await sync_to_async(initialize)(request)
+            if error is not None:
+                if isinstance(error, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    error.status_code = status.HTTP_401_UNAUTHORIZED
+                headers = {'Retry-After': str(math.ceil(error.wait))} if getattr(error, 'wait', None) else None
+                return JsonResponse({'detail': str(error.detail)}, status=error.status_code, headers=headers)
+            return await view(drf_request, *args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+# -----------------------
+# Tower Credential Proxy
+# -----------------------
+async def _stream_json_array(pages):
+    """Encodes paged results as one JSON array, a page at a time."""
+    yield '['
+    separator = ''
+    try:
+        async for page in pages:
+            if page:
+                yield separator + ','.join(json.dumps(item) for item in page)
+                separator = ','
+    except requests.exceptions.RequestException as e:
+        # Headers are already sent; leave the array unterminated so clients see the failure
+        logger.warning("Tower proxy error: %s", e)
+        return
+    yield ']'
+
+
+async def _stream_ndjson(pages):
+    """Encodes paged results as newline-delimited JSON, a page at a time."""
+    try:
+        async for page in pages:
+            if page:
+                yield ''.join(json.dumps(item) + '\n' for item in page)
+    except requests.exceptions.RequestException as e:
+        logger.warning("Tower proxy error: %s", e)
+        yield json.dumps({'detail': f'Error contacting Tower: {e}'}) + '\n'
+
+
+async def _batched(rows, size):
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _streaming_pages(request, pages):
+    if request.query_params.get('output') == 'ndjson':
+        return StreamingHttpResponse(_stream_ndjson(pages), content_type='application/x-ndjson')
+    return StreamingHttpResponse(_stream_json_array(pages), content_type='application/json')
+
+
+@async_api_view(['GET'])
+async def tower_credentials(request):
+    """Proxies credential list calls to Ansible Tower using DB-stored credentials.
+
+    Every page of /api/v2/credentials/ is followed and streamed to the client as a
+    JSON array, or as NDJSON when called with ?output=ndjson. With ?instance=<id>
+    the credentials of that TowerInstance are served from the local mirror instead.
+    """
+    if request.query_params.get('instance'):
+        return await _credentials_from_mirror(request, request.query_params['instance'])
+
+    cfg = await TowerConfig.objects.afirst()
+    if not cfg:
+        return JsonResponse(
+            {"detail": "TowerConfig not configured."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    # Fetch the first page eagerly so an unreachable Tower still maps to a 502
+    try:
+        first_page = await get_async_client(cfg).get_json(
+            '/api/v2/credentials/', params={'page_size': client_settings()['PAGE_SIZE']}
+        )
+    except requests.exceptions.RequestException as e:
+        logger.warning("Tower proxy error: %s", e)
+        return JsonResponse(
+            {"detail": f"Error contacting Tower: {e}"},
+            status=status.HTTP_502_BAD_GATEWAY
+        )
+    return _streaming_pages(request, _credential_pages(cfg, first_page))
+
+
+async def _credential_pages(cfg, first_page):
+    # Looks the client up again when streaming starts: under WSGI the body is
+    # consumed on a different event loop than the one the view ran on
+    async for page in get_async_client(cfg).iter_pages('/api/v2/credentials/', first_page=first_page):
+        yield page
+
+
+async def _credentials_from_mirror(request, instance_id):
+    try:
+        instance = await TowerInstance.objects.aget(pk=instance_id)
+    except (TowerInstance.DoesNotExist, ValueError):
+        return JsonResponse({"detail": "No TowerInstance matches the given query."}, status=status.HTTP_404_NOT_FOUND)
+
+    state = await instance.sync_states.filter(resource='credentials').afirst()
+    if instance.pk not in await sync_to_async(fresh_instance_ids)('credentials', [instance]):
+        return JsonResponse(
+            {"detail": "No recent mirror of this Tower instance. Run sync_tower_inventory."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    rows = (
+        TowerCredentialMirror.objects
+        .filter(tower_instance=instance)
+        .order_by('remote_id')
+        .values_list('data', flat=True)
+        .aiterator(chunk_size=500)
+    )
+    response = _streaming_pages(request, _batched(rows, 500))
+    response['X-Tower-Synced-At'] = state.last_synced_at.isoformat()
+    return response
+
+
+# -----------------------
+# Credential types
+# -----------------------
+async def get_tower_credential_types(tower_instance):
+    """Fetches every credential type of a Tower instance, following pagination."""
+    if not tower_instance.username or not tower_instance.password:
+        raise ValueError(f"No credentials configured for Tower instance: {tower_instance.name}")
+
+    try:
+        pages = get_async_client(tower_instance).iter_pages('/api/v2/credential_types/')
+        return [credential_type async for page in pages for credential_type in page]
+    except requests.exceptions.RequestException as e:
+        raise ConnectionError(f"Failed to connect to Tower instance {tower_instance.name}: {e}")
+
+
+async def create_tower_credential_type(tower_instance, credential_type_data):
+    """Creates a credential type in a Tower instance and returns it as Tower reports it."""
+    if not tower_instance.username or not tower_instance.password:
+        raise ValueError(f"No credentials configured for Tower instance: {tower_instance.name}")
+
+    client = get_async_client(tower_instance)
+    try:
+        response = await client.post('/api/v2/credential_types/', json=credential_type_data)
+        client.raise_for_status(response)
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        raise ConnectionError(f"Failed to create credential type in Tower instance {tower_instance.name}: {e}")
+
+
+async def get_tower_credential_type_by_name(tower_instance, credential_type_name):
+    """Fetches a credential type by exact name from a Tower instance; None when there is none."""
+    if not tower_instance.username or not tower_instance.password:
+        raise ValueError(f"No credentials configured for Tower instance: {tower_instance.name}")
+
+    try:
+        data = await get_async_client(tower_instance).get_json(
+            '/api/v2/credential_types/', params={'name': credential_type_name}
+        )
+    except requests.exceptions.RequestException as e:
+        raise ConnectionError(
+            f"Failed to fetch credential type '{credential_type_name}' from Tower instance {tower_instance.name}: {e}"
+        )
+    results = data.get('results', [])
+    return results[0] if results else None
+
+
+async def _credential_type_inventories(instances):
+    """Maps each instance's pk to the set of its credential type names, or to the error that prevented reading it.
+
+    Instances with a fresh local mirror are read from the DB; the others are
+    downloaded once each, all towers concurrently.
+    """
+    mirrored_ids = await sync_to_async(fresh_instance_ids)('credential_types', instances)
+    inventories = {pk: set() for pk in mirrored_ids}
+    mirrored_names = TowerCredentialTypeMirror.objects.filter(
+        tower_instance_id__in=mirrored_ids
+    ).values_list('tower_instance_id', 'name')
+    async for instance_id, name in mirrored_names:
+        inventories[instance_id].add(name)
+
+    live_instances = [instance for instance in instances if instance.pk not in mirrored_ids]
+    for instance, credential_types, error in await async_fan_out(get_tower_credential_types, live_instances):
+        if error is not None:
+            logger.warning("Error fetching credential types from %s: %s", instance.name, error)
+            inventories[instance.pk] = error
+        else:
+            inventories[instance.pk] = {credential_type.get('name') for credential_type in credential_types}
+    return inventories
+
+
+@async_api_view(['GET'])
+async def credential_type_status(request):
+    """Returns all CredentialTypes with their presence status across Tower instances.
+
+    Green: present on every instance; Orange: on more than half; Red: otherwise.
+    """
+    credential_types = [credential_type async for credential_type in CredentialType.objects.order_by('name')]
+    instances = [instance async for instance in TowerInstance.objects.order_by('name')]
+    inventories = await _credential_type_inventories(instances)
+
+    results = []
+    for credential_type in credential_types:
+        present, missing = [], []
+        for instance in instances:
+            inventory = inventories[instance.pk]
+            if isinstance(inventory, Exception):
+                missing.append(f"{instance.name} (Error: {inventory})")
+            elif credential_type.name in inventory:
+                present.append(instance.name)
+            else:
+                missing.append(instance.name)
+
+        if not instances:
+            type_status = 'N/A'  # No instances configured
+        elif len(present) == len(instances):
+            type_status = 'Green'
+        elif len(present) * 2 > len(instances):
+            type_status = 'Orange'
+        else:
+            type_status = 'Red'
+        results.append({
+            'id': credential_type.pk,
+            'name': credential_type.name,
+            'description': credential_type.description,
+            'present_in_instances': present,
+            'missing_in_instances': missing,
+            'status': type_status,
+        })
+
+    return JsonResponse(results, status=status.HTTP_200_OK, safe=False)
+
+
+@async_api_view(['POST'])
+async def duplicate_missing_credential_type(request):
+    """Creates a credential type on the instances where it is missing.
+
+    Target instances are resolved in one query and duplicated concurrently;
+    per-instance results are streamed back as each tower answers (a JSON array,
+    or NDJSON with ?output=ndjson).
+    """
+    credential_type_id = request.data.get('id')
+    missing_in_instances = request.data.get('missing_in_instances', [])
+
+    if not credential_type_id or not missing_in_instances:
+        return JsonResponse({'message': 'Credential type ID and missing instances are required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        credential_type = await CredentialType.objects.aget(id=credential_type_id)
+    except (CredentialType.DoesNotExist, ValueError):
+        return JsonResponse({'message': 'CredentialType not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    instances = {instance.name: instance async for instance in TowerInstance.objects.filter(name__in=missing_in_instances)}
+    mirrored_ids = await sync_to_async(fresh_instance_ids)('credential_types', list(instances.values()))
+    present_in_mirror = {
+        instance_id async for instance_id in TowerCredentialTypeMirror.objects.filter(
+            tower_instance_id__in=mirrored_ids, name=credential_type.name
+        ).values_list('tower_instance_id', flat=True)
+    }
+    credential_type_data = {
+        'name': credential_type.name,
+        'description': credential_type.description,
+        'kind': credential_type.kind,
+        'inputs': credential_type.inputs,
+        'injectors': credential_type.injectors,
+    }
+
+    async def duplicate(instance):
+        # Check it is still missing first; cached and in-flight inventory downloads are reused
+        if credential_type.name in {t.get('name') for t in await get_tower_credential_types(instance)}:
+            return None
+        return await create_tower_credential_type(instance, credential_type_data)
+
+    async def results():
+        for instance_name in missing_in_instances:
+            instance = instances.get(instance_name)
+            if instance is None:
+                yield [{'instance': instance_name, 'status': 'instance_not_found'}]
+            elif instance.pk in present_in_mirror:
+                yield [{'instance': instance.name, 'status': 'already_exists'}]
+
+        targets = [instance for instance in instances.values() if instance.pk not in present_in_mirror]
+        async for instance, created, error in async_iter_fan_out(duplicate, targets):
+            if error is not None:
+                logger.warning("Error duplicating credential type %s to %s: %s", credential_type.name, instance.name, error)
+                yield [{'instance': instance.name, 'status': 'error', 'message': str(error)}]
+            elif created is None:
+                yield [{'instance': instance.name, 'status': 'already_exists'}]
+            else:
+                invalidate_tower_cache(instance, '/api/v2/credential_types/')
+                await sync_to_async(mirror_object)(instance, 'credential_types', created)
+                yield [{'instance': instance.name, 'status': 'duplicated'}]
+
+    # Each result is a one-item page for the shared streaming encoders
+    return _streaming_pages(request, results())
+
+
+@async_api_view(['POST'])
+async def verify_credential_type_by_name(request):
+    """Checks whether the instances missing a credential type carry it under an alternative name."""
+    credential_type_id = request.data.get('id')
+    alternative_name = request.data.get('alternative_name')
+    missing_in_instances = request.data.get('missing_in_instances', [])
+
+    if not credential_type_id or not alternative_name or not missing_in_instances:
+        return JsonResponse({'message': 'Credential type ID, alternative name, and missing instances are required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        exists = await CredentialType.objects.filter(id=credential_type_id).aexists()
+    except ValueError:
+        exists = False
+    if not exists:
+        return JsonResponse({'message': 'CredentialType not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    instances = {instance.name: instance async for instance in TowerInstance.objects.filter(name__in=missing_in_instances)}
+    mirrored_ids = await sync_to_async(fresh_instance_ids)('credential_types', list(instances.values()))
+
+    async def lookup(instance):
+        if instance.pk in mirrored_ids:
+            mirrored = await TowerCredentialTypeMirror.objects.filter(tower_instance=instance, name=alternative_name).afirst()
+            return mirrored.data if mirrored else None
+        return await get_tower_credential_type_by_name(instance, alternative_name)
+
+    # All instances are checked concurrently; results keep the requested order
+    found = {
+        instance.name: (found_type, error)
+        for instance, found_type, error in await async_fan_out(lookup, list(instances.values()))
+    }
+
+    results = []
+    for instance_name in missing_in_instances:
+        if instance_name not in found:
+            results.append({'instance': instance_name, 'status': 'instance_not_found'})
+            continue
+        found_type, error = found[instance_name]
+        if error is not None:
+            logger.warning("Error looking up credential type %s on %s: %s", alternative_name, instance_name, error)
+            results.append({'instance': instance_name, 'status': 'error', 'message': str(error)})
+        elif found_type:
+            results.append({'instance': instance_name, 'status': 'found', 'found_name': found_type.get('name')})
+        else:
+            results.append({'instance': instance_name, 'status': 'not_found'})
+
+    return JsonResponse(results, status=status.HTTP_200_OK, safe=False)
+
+
+# -----------------------
+# Connection test
+# -----------------------
+@async_api_view(['POST'])
+async def test_connection(request):
+    """Tests connection to an AAP instance with provided credentials."""
+    url = request.data.get('url')
+    username = request.data.get('username')
+    password = request.data.get('password')
+
+    if not url or not username or not password:
+        return JsonResponse({'message': 'URL, username, and password are required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    client = get_async_client_for_url(url, username, password)
+    try:
+        # Using a small timeout to quickly check reachability
+        response = await client.get('/api/v2/ping/', timeout=5)  # Common AAP health check endpoint
+        client.raise_for_status(response)
+        return JsonResponse({'message': 'Connection successful!'}, status=status.HTTP_200_OK)
+    except requests.exceptions.Timeout:
+        return JsonResponse({'message': 'Connection timed out.'}, status=status.HTTP_408_REQUEST_TIMEOUT)
+    except requests.exceptions.ConnectionError:
+        return JsonResponse({'message': 'Could not connect to the AAP instance. Check the URL.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code in [401, 403]:
+            return JsonResponse({'message': 'Authentication failed: Invalid credentials.'}, status=status.HTTP_401_UNAUTHORIZED)
+        return JsonResponse(
+            {'message': f'HTTP Error: {e.response.status_code} - {e.response.reason_phrase}'},
+            status=e.response.status_code
+        )
+    except Exception as e:
+        return JsonResponse({'message': f'An unexpected error occurred: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    finally:
+        await client.close()
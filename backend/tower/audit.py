@@ -0,0 +1,282 @@
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models
+from django.db.models.signals import post_save, post_delete
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditLog, TowerInstance, Credential, CredentialType, ExecutionEnvironment
+from .versioning import bump_table_version
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ASYNC': True,          # False writes every entry synchronously, as log_action used to
+    'BATCH_SIZE': 200,      # queue length that triggers an immediate flush
+    'FLUSH_INTERVAL': 1.0,  # seconds between background flushes
+    'SPOOL_PATH': None,     # JSON-lines file for entries that could not be written to the DB
+}
+
+AUDITED_MODELS = (TowerInstance, Credential, CredentialType, ExecutionEnvironment)
+
+
+def audit_settings():
+    """Returns the AUDIT_LOG settings merged over the defaults."""
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, 'AUDIT_LOG', {}))
+    return conf
+
+
+class AuditWriter:
+    """Queues AuditLog rows in memory and writes them with bulk_create.
+
+    A daemon thread flushes every FLUSH_INTERVAL seconds, or as soon as
+    BATCH_SIZE entries are waiting. Batches the DB rejects, and whatever is
+    still queued at interpreter exit when the DB is gone, are appended to
+    SPOOL_PATH and replayed on the next successful flush.
+    """
+
+    def __init__(self):
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def enqueue(self, entry):
+        self.enqueue_many([entry])
+
+    def enqueue_many(self, entries):
+        conf = audit_settings()
+        if not conf['ASYNC']:
+            AuditLog.objects.bulk_create(entries, batch_size=conf['BATCH_SIZE'])
+            bump_table_version(AuditLog)
+            return
+
+        with self._lock:
+            self._queue.extend(entries)
+            pending = len(self._queue)
+        self._ensure_thread()
+        if pending >= conf['BATCH_SIZE']:
+            self._wakeup.set()
+
+    def flush(self):
+        """Writes everything queued so far; returns the number of rows written."""
+        written = 0
+        with self._flush_lock:
+            try:
+                written += self._replay_spool()
+            except Exception:
+                logger.exception("Could not replay the audit spool; will retry on the next flush")
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(len(self._queue), audit_settings()['BATCH_SIZE']))]
+                if not batch:
+                    break
+                try:
+                    AuditLog.objects.bulk_create(batch)
+                    written += len(batch)
+                except Exception:
+                    logger.exception("Audit log flush failed; spooling %d entries", len(batch))
+                    self._spool(batch)
+                    break
+        if written:
+            bump_table_version(AuditLog)
+        return written
+
+    def pending(self):
+        return len(self._queue)
+
+    def shutdown(self):
+        try:
+            self.flush()
+        except Exception:
+            with self._lock:
+                batch, self._queue = list(self._queue), deque()
+            self._spool(batch)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(audit_settings()['FLUSH_INTERVAL'])
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Audit log writer error")
+            finally:
+                connections.close_all()
+
+    def _spool(self, entries):
+        path = audit_settings()['SPOOL_PATH']
+        if not path or not entries:
+            if entries:
+                logger.error("Dropping %d audit entries: no AUDIT_LOG['SPOOL_PATH'] configured", len(entries))
+            return
+        with open(path, 'a', encoding='utf-8') as spool:
+            for entry in entries:
+                spool.write(json.dumps({
+                    'user': entry.user,
+                    'action': entry.action,
+                    'object_type': entry.object_type,
+                    'object_repr': entry.object_repr,
+                    'object_id': entry.object_id,
+                    'timestamp': entry.timestamp.isoformat(),
+                    'changes': entry.changes,
+                }, default=str) + '\n')
+
+    def _replay_spool(self):
+        path = audit_settings()['SPOOL_PATH']
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path, encoding='utf-8') as spool:
+            rows = [json.loads(line) for line in spool if line.strip()]
+        for row in rows:
+            row['timestamp'] = parse_datetime(row['timestamp'])
+        AuditLog.objects.bulk_create([AuditLog(**row) for row in rows], batch_size=audit_settings()['BATCH_SIZE'])
+        os.remove(path)
+        return len(rows)
+
+
+audit_writer = AuditWriter()
+atexit.register(audit_writer.shutdown)
+
+
+# -----------------------
+# Change sets
+# -----------------------
+MASK = '********'
+_encoder = DjangoJSONEncoder()
+
+
+def _json_safe(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, models.Model):
+        return value.pk
+    try:
+        return _encoder.default(value)
+    except TypeError:
+        return str(value)
+
+
+def compute_changes(serializer):
+    """Returns the JSON-safe change set an update serializer is about to apply.
+
+    Must be called after is_valid() and before save(): the old values are read
+    from the already-loaded serializer.instance (no extra query) and only the
+    fields present in validated_data are compared. Write-only fields (passwords)
+    are reported as changed without their values.
+    """
+    instance = serializer.instance
+    changes = {}
+    for name, new_value in serializer.validated_data.items():
+        field = serializer.fields.get(name)
+        model_field = instance._meta.get_field(field.source if field and field.source != '*' else name)
+        if model_field.is_relation:
+            old_value = getattr(instance, model_field.attname)
+            new_value = new_value.pk if isinstance(new_value, models.Model) else new_value
+        else:
+            old_value = getattr(instance, model_field.attname)
+
+        if old_value == new_value:
+            continue
+        if field is not None and field.write_only:
+            changes[name] = {'from': MASK, 'to': MASK}
+        else:
+            changes[name] = {'from': _json_safe(old_value), 'to': _json_safe(new_value)}
+    return changes
+
+
+# -----------------------
+# Model signals
+# -----------------------
+# Per thread and per asyncio task, so concurrent async requests do not see each other's state
+_local = Local()
+
+
+@contextmanager
+def audit_signals_suppressed():
+    """Used by code that writes its own, richer audit entry (e.g. the viewsets)."""
+    _local.suppressed = getattr(_local, 'suppressed', 0) + 1
+    try:
+        yield
+    finally:
+        _local.suppressed -= 1
+
+
+def current_username():
+    request = getattr(_local, 'request', None)
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.username
+    return None
+
+
+class AuditContextMiddleware:
+    """Remembers the current request so signal-captured entries can name the acting user.
+
+    Async-capable, so async views are not pushed onto a thread by this middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        _local.request = request
+        try:
+            return self.get_response(request)
+        finally:
+            _local.request = None
+
+    async def __acall__(self, request):
+        _local.request = request
+        try:
+            return await self.get_response(request)
+        finally:
+            _local.request = None
+
+
+def audit_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or getattr(_local, 'suppressed', 0):
+        return
+    from .utils import log_action
+    log_action(user=current_username(), action='created' if created else 'updated', obj=instance)
+
+
+def audit_deleted(sender, instance, **kwargs):
+    if getattr(_local, 'suppressed', 0):
+        return
+    from .utils import log_action
+    log_action(user=current_username(), action='deleted', obj=instance)
+
+
+# Connected per model: a receiver without a sender would also disable
+# Django's fast (no-fetch) deletes of every other model
+for _model in AUDITED_MODELS:
+    post_save.connect(audit_saved, sender=_model)
+    post_delete.connect(audit_deleted, sender=_model)
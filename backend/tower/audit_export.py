@@ -0,0 +1,68 @@
+import csv
+import io
+import json
+import zlib
+from itertools import islice
+
+from .models import AuditLog
+
+
+EXPORT_FIELDS = ('id', 'timestamp', 'user', 'action', 'object_type', 'object_id', 'object_repr', 'changes')
+
+
+def _batches(rows, size):
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _encode_ndjson(batches):
+    for batch in batches:
+        lines = []
+        for row in batch:
+            record = dict(zip(EXPORT_FIELDS, row))
+            record['timestamp'] = record['timestamp'].isoformat()
+            lines.append(json.dumps(record, default=str))
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _encode_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for batch in batches:
+        for row in batch:
+            row = list(row)
+            row[1] = row[1].isoformat()
+            row[-1] = json.dumps(row[-1], default=str) if row[-1] is not None else ''
+            writer.writerow(row)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_audit_export(queryset=None, output='ndjson', compress=False, chunk_size=2000):
+    """Yields an audit log export as bytes chunks, in id order.
+
+    Rows are read with values_list().iterator(), encoded and (optionally)
+    gzipped a chunk at a time, so memory stays constant however many rows
+    match. Resume an interrupted export by filtering on id__gt the last id
+    received (after_id in filter_audit_logs).
+    """
+    if queryset is None:
+        queryset = AuditLog.objects.all()
+    rows = queryset.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    batches = _batches(rows, chunk_size)
+    chunks = _encode_csv(batches) if output == 'csv' else _encode_ndjson(batches)
+    return _gzip(chunks) if compress else chunks
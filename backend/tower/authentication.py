@@ -0,0 +1,154 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils.timezone import now
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import TokenRevocation
+from .blacklist import blacklist_filter, blacklist_settings
+
+
+# User fields copied into every token; changing any of them revokes the user's tokens
+TOKEN_USER_CLAIMS = ('username', 'email', 'role')
+
+
+class RoleClaimsRefreshToken(RefreshToken):
+    """Refresh token (and derived access tokens) carrying the user's username, email and role.
+
+    Also used to verify incoming refresh tokens, so blacklist checks go
+    through the in-memory filter in tower/blacklist.py.
+    """
+
+    @classmethod
+    def for_user(cls, user, session_start=None):
+        """session_start carries the original login time across refreshes."""
+        token = super().for_user(user)
+        for claim in TOKEN_USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        # Copied to access tokens minted from this refresh token, unlike 'iat'
+        token['auth_time'] = time.time()
+        token['session_start'] = session_start or token['auth_time']
+        return token
+
+    def check_blacklist(self):
+        # Most tokens were never blacklisted; the in-memory filter proves that without a query,
+        # as of its last catch-up with the other workers (at most FILTER_REFRESH seconds ago)
+        if blacklist_settings()['FILTER_ENABLED']:
+            if not blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+                return
+        super().check_blacklist()
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted
+
+
+def session_expired(token):
+    """Whether a refresh token's session has outlived SESSION_MAX_LIFETIME, however often it was refreshed."""
+    max_lifetime = getattr(settings, 'SESSION_MAX_LIFETIME', None)
+    started = token.get('session_start')
+    if max_lifetime is None or started is None:
+        return False
+    return time.time() - started > max_lifetime.total_seconds()
+
+
+def _revocation_horizon():
+    # A token issued before a revocation stays dangerous until it could have expired
+    return max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+
+
+class RevocationCache:
+    """Per-process copy of the recent TokenRevocation rows, reloaded every TOKEN_REVOCATION_TTL seconds.
+
+    Keeps stateless authentication at one query per process per TTL instead of
+    one per request; a role change reaches other workers within the TTL.
+    """
+
+    def __init__(self):
+        self._revoked = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def revoked_at(self, user_id):
+        """Returns the revocation time of user_id as a Unix timestamp, or None."""
+        ttl = getattr(settings, 'TOKEN_REVOCATION_TTL', 5)
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= ttl:
+                rows = TokenRevocation.objects.filter(revoked_at__gte=now() - _revocation_horizon())
+                self._revoked = {row.user_id: row.revoked_at.timestamp() for row in rows}
+                self._loaded_at = time.monotonic()
+            return self._revoked.get(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+revocations = RevocationCache()
+
+
+def revoke_tokens(user_id):
+    """Refuses every token of user_id issued so far, e.g. after a role change or deletion."""
+    TokenRevocation.objects.update_or_create(user_id=user_id, defaults={'revoked_at': now()})
+    TokenRevocation.objects.filter(revoked_at__lt=now() - _revocation_horizon()).delete()
+    revocations.clear()
+
+
+# -----------------------
+# User signals
+# -----------------------
+# Besides the claims, deactivating a user or changing their password ends their sessions
+REVOKING_FIELDS = TOKEN_USER_CLAIMS + ('is_active', 'password')
+
+
+def _remember_revoking_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    # The stored values, read before the save overwrites them; skipped for e.g. last_login updates
+    instance._revoking_fields = None
+    if raw or instance.pk is None or (update_fields is not None and not set(update_fields) & set(REVOKING_FIELDS)):
+        return
+    instance._revoking_fields = sender._default_manager.filter(pk=instance.pk).values(*REVOKING_FIELDS).first()
+
+
+def revoke_on_user_change(sender, instance, created, raw=False, **kwargs):
+    """Revokes the user's tokens whatever saved the change: the API, Django admin or the shell.
+
+    QuerySet.update() sends no signals; call revoke_tokens() after using it on users.
+    """
+    before = getattr(instance, '_revoking_fields', None)
+    if created or raw or before is None:
+        return
+    if any(before[field] != getattr(instance, field) for field in REVOKING_FIELDS):
+        revoke_tokens(instance.pk)
+
+
+def revoke_on_user_delete(sender, instance, **kwargs):
+    revoke_tokens(instance.pk)
+
+
+pre_save.connect(_remember_revoking_fields, sender=settings.AUTH_USER_MODEL)
+post_save.connect(revoke_on_user_change, sender=settings.AUTH_USER_MODEL)
+post_delete.connect(revoke_on_user_delete, sender=settings.AUTH_USER_MODEL)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """JWT authentication that builds request.user from the token claims instead of the database.
+
+    request.user is a simplejwt TokenUser; attributes such as role and email
+    resolve to token claims. Tokens issued before role claims were added fall
+    back to loading the CustomUser row.
+    """
+
+    def get_user(self, validated_token):
+        if 'role' not in validated_token:
+            return JWTAuthentication.get_user(self, validated_token)
+
+        revoked_at = revocations.revoked_at(validated_token.get(api_settings.USER_ID_CLAIM))
+        if revoked_at is not None and validated_token.get('auth_time', 0) <= revoked_at:
+            raise InvalidToken("Token was revoked; sign in again", code='token_revoked')
+        return super().get_user(validated_token)
@@ -0,0 +1,137 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils.timezone import now
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+DEFAULTS = {
+    'FILTER_ENABLED': True,
+    'FILTER_CAPACITY': 100000,      # blacklisted tokens the filter is sized for (it grows on rebuild)
+    'FILTER_ERROR_RATE': 0.001,     # false positives, i.e. unnecessary DB lookups
+    'FILTER_REFRESH': 2,            # seconds a token blacklisted by another worker may still be accepted here
+    'FILTER_REBUILD': 3600,         # seconds between full rebuilds that drop expired tokens
+    'PRUNE_BATCH_SIZE': 1000,       # rows deleted per statement by prune_token_blacklist
+}
+
+# Catch-ups re-read this much history, for rows committed after a later blacklisted_at
+CATCH_UP_OVERLAP = timedelta(seconds=30)
+
+
+def blacklist_settings():
+    """Returns the TOKEN_BLACKLIST settings merged over the defaults."""
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, 'TOKEN_BLACKLIST', {}))
+    return conf
+
+
+class BloomFilter:
+    """Fixed-size set membership test with no false negatives."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class BlacklistFilter:
+    """Per-process Bloom filter of the jtis of unexpired blacklisted tokens.
+
+    A miss means the token is not blacklisted and the BlacklistedToken lookup
+    can be skipped; a hit still goes to the database. Tokens blacklisted by
+    this process are added immediately, those blacklisted by other workers
+    within FILTER_REFRESH seconds (one indexed range query). Until then a
+    token rotated or logged out on another worker is still accepted here, so
+    FILTER_REFRESH bounds how long a stolen refresh token outlives its
+    revocation; set FILTER_ENABLED to False to check every token in the
+    database instead. The filter is rebuilt from scratch every FILTER_REBUILD
+    seconds, or once it holds more than it was sized for, so expired tokens
+    do not fill it up.
+    """
+
+    def __init__(self):
+        self._bloom = None
+        self._capacity = 0
+        self._built_at = None
+        self._caught_up_at = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def might_contain(self, jti):
+        conf = blacklist_settings()
+        with self._lock:
+            elapsed = time.monotonic() - (self._built_at or 0)
+            if self._bloom is None or elapsed >= conf['FILTER_REBUILD'] or self._bloom.count > self._capacity:
+                self._rebuild(conf)
+            elif time.monotonic() - self._checked_at >= conf['FILTER_REFRESH']:
+                self._catch_up(self._caught_up_at - CATCH_UP_OVERLAP)
+            return jti in self._bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+    def clear(self):
+        with self._lock:
+            self._bloom = None
+
+    def _rebuild(self, conf):
+        current = BlacklistedToken.objects.filter(token__expires_at__gt=now()).count()
+        self._capacity = max(conf['FILTER_CAPACITY'], 2 * current)
+        self._bloom = BloomFilter(self._capacity, conf['FILTER_ERROR_RATE'])
+        self._built_at = time.monotonic()
+        self._catch_up(None)
+
+    def _catch_up(self, since):
+        started = now()
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=started)
+        if since is not None:
+            rows = rows.filter(blacklisted_at__gte=since)
+        for jti in rows.values_list('token__jti', flat=True).iterator():
+            self._bloom.add(jti)
+        self._caught_up_at = started
+        self._checked_at = time.monotonic()
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def prune_expired_tokens(batch_size=None):
+    """Deletes expired outstanding tokens (and their blacklist rows) in bounded batches.
+
+    Unlike simplejwt's flushexpiredtokens, no single statement touches more
+    than batch_size rows, so the tables are never locked for long. Returns
+    the number of outstanding tokens deleted.
+    """
+    batch_size = batch_size or blacklist_settings()['PRUNE_BATCH_SIZE']
+    cutoff = now()
+    deleted = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=cutoff)
+            .order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
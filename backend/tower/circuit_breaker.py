@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULTS = {
+    'WINDOW': 60,           # seconds of call outcomes used to compute the failure rate
+    'MIN_CALLS': 5,         # calls needed in the window before the breaker may open
+    'FAILURE_RATE': 0.5,    # fraction of failed calls that opens the breaker
+    'OPEN_SECONDS': 30,     # how long an open breaker rejects calls before probing
+    'HALF_OPEN_CALLS': 1,   # probe calls let through while half-open
+    'PROBE_TIMEOUT': 60,    # seconds after which an unreported probe frees its slot
+}
+
+
+def breaker_settings():
+    """Returns the TOWER_CIRCUIT_BREAKER settings merged over the defaults."""
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, 'TOWER_CIRCUIT_BREAKER', {}))
+    return conf
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a Tower whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker for one Tower target.
+
+    closed -> open when FAILURE_RATE of the calls in the last WINDOW seconds
+    failed; open -> half_open after OPEN_SECONDS; half_open -> closed on a
+    successful probe, or back to open on a failed one. Every call that allow()
+    let through must be followed by one record(); a probe that never reports
+    back (its worker died) stops holding its slot after PROBE_TIMEOUT.
+    """
+
+    def __init__(self, key, on_state_change=None):
+        self.key = key
+        self.state = CLOSED
+        self.opened_at = None
+        self.on_state_change = on_state_change
+        self._outcomes = deque()
+        self._probes = deque()  # start times of unreported half-open probes
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns whether a call may go out now; half-open probes are counted."""
+        transition = None
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < breaker_settings()['OPEN_SECONDS']:
+                    return False
+                transition = self._set_state(HALF_OPEN)
+                self._probes.clear()
+            if self.state == HALF_OPEN:
+                conf = breaker_settings()
+                now = time.monotonic()
+                while self._probes and self._probes[0] <= now - conf['PROBE_TIMEOUT']:
+                    self._probes.popleft()
+                allowed = len(self._probes) < conf['HALF_OPEN_CALLS']
+                if allowed:
+                    self._probes.append(now)
+            else:
+                allowed = True
+        self._notify(transition)
+        return allowed
+
+    def record(self, success):
+        """Reports the outcome of a call allow() let through.
+
+        success=None means no verdict (e.g. the call was cancelled): a probe
+        slot is freed, but the state does not change.
+        """
+        conf = breaker_settings()
+        transition = None
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if self._probes:
+                    self._probes.popleft()
+                if success is not None:
+                    transition = self._set_state(CLOSED if success else OPEN)
+            elif self.state == CLOSED and success is not None:
+                now = time.monotonic()
+                self._outcomes.append((now, success))
+                while self._outcomes and self._outcomes[0][0] < now - conf['WINDOW']:
+                    self._outcomes.popleft()
+                calls = len(self._outcomes)
+                failures = sum(1 for _, ok in self._outcomes if not ok)
+                if calls >= conf['MIN_CALLS'] and failures / calls >= conf['FAILURE_RATE']:
+                    transition = self._set_state(OPEN)
+        self._notify(transition)
+
+    def reset(self):
+        with self._lock:
+            transition = self._set_state(CLOSED)
+        self._notify(transition)
+
+    def snapshot(self):
+        conf = breaker_settings()
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0.0, conf['OPEN_SECONDS'] - (time.monotonic() - self.opened_at))
+            return {
+                'state': self.state,
+                'calls_in_window': calls,
+                'failures_in_window': failures,
+                'retry_in_seconds': retry_in,
+            }
+
+    def _set_state(self, state):
+        # Caller holds the lock; returns the transition to announce once it is released
+        if state == self.state:
+            return None
+        previous, self.state = self.state, state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state == CLOSED:
+            self._outcomes.clear()
+        return (previous, state)
+
+    def _notify(self, transition):
+        if transition is not None and self.on_state_change is not None:
+            self.on_state_change(self.key, *transition)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(key, on_state_change=None):
+    """Returns the breaker for a client key; breakers outlive reconfigured clients."""
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(key, on_state_change)
+        return breaker
+
+
+def find_breaker(key):
+    return _breakers.get(key)
@@ -0,0 +1,305 @@
+"""A stand-in Ansible Automation Platform API for offline and performance testing.
+
+Serves the endpoints this app calls (/api/v2/ping/, credentials, credential
+types and execution environments) from a generated in-memory inventory, with
+AAP's pagination, filtering and error shapes. Latency, jitter, server errors
+and authentication failures can be injected, all drawn from a seeded RNG, so
+a benchmark against it is reproducible.
+
+Run it with `python manage.py run_fake_aap`, or embed it:
+
+    server = FakeAAPServer(('127.0.0.1', 0), FakeAAP(credentials=5000, latency=0.05))
+    server.start()
+    ...
+    server.stop()
+
+Only the standard library is used; nothing here touches Django.
+"""
+import base64
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+
+RESOURCES = ('credentials', 'credential_types', 'execution_environments')
+API_PREFIX = '/api/v2/'
+
+DEFAULT_PAGE_SIZE = 25  # AAP's default
+MAX_PAGE_SIZE = 200     # AAP's cap on ?page_size=
+
+_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _timestamp(moment):
+    return moment.isoformat().replace('+00:00', 'Z')
+
+
+class FakeAAP:
+    """The inventory and failure model behind a FakeAAPServer.
+
+    Sizes are row counts per resource. latency and jitter are seconds: every
+    response is delayed by latency plus a uniform draw from [0, jitter).
+    error_rate and auth_failure_rate are probabilities per request of a
+    500/502/503 and of a 401. With etags=True list and detail responses carry
+    an ETag and honour If-None-Match, which real AAP does not do. An
+    api_prefix other than /api/v2/ serves the API there and answers /api/v2/
+    with a 301 to it, like the platform gateway of AAP 2.5 (/api/controller/v2/).
+    """
+
+    def __init__(self, credentials=100, credential_types=30, execution_environments=10,
+                 username='admin', password='password', latency=0.0, jitter=0.0,
+                 error_rate=0.0, auth_failure_rate=0.0, etags=False, api_prefix=API_PREFIX, seed=0):
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.auth_failure_rate = auth_failure_rate
+        self.etags = etags
+        self.api_prefix = api_prefix
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = Counter()
+        self._rows = {
+            'credential_types': [self._credential_type(pk) for pk in range(1, credential_types + 1)],
+            'execution_environments': [self._execution_environment(pk) for pk in range(1, execution_environments + 1)],
+        }
+        self._rows['credentials'] = [
+            self._credential(pk, (pk - 1) % max(credential_types, 1) + 1) for pk in range(1, credentials + 1)
+        ]
+
+    # -----------------------
+    # Generated inventory
+    # -----------------------
+    @staticmethod
+    def _base(pk, kind, name):
+        moment = _EPOCH + timedelta(minutes=pk)
+        return {
+            'id': pk,
+            'type': kind,
+            'url': f'{API_PREFIX}{kind}s/{pk}/',
+            'name': name,
+            'description': '',
+            'created': _timestamp(moment),
+            'modified': _timestamp(moment),
+        }
+
+    def _credential_type(self, pk):
+        row = self._base(pk, 'credential_type', f'Credential Type {pk}')
+        row.update(kind='cloud', namespace=None, managed=False, inputs={'fields': []}, injectors={})
+        return row
+
+    def _credential(self, pk, credential_type):
+        row = self._base(pk, 'credential', f'Credential {pk}')
+        row.update(
+            credential_type=credential_type,
+            organization=1,
+            inputs={'username': f'user{pk}', 'password': '$encrypted$'},
+            managed=False,
+            summary_fields={'credential_type': {'id': credential_type, 'name': f'Credential Type {credential_type}'}},
+        )
+        return row
+
+    def _execution_environment(self, pk):
+        row = self._base(pk, 'execution_environment', f'Execution Environment {pk}')
+        row.update(
+            image=f'quay.io/example/ee-{pk}:latest',
+            pull='missing',
+            organization=None,
+            credential=None,
+            managed=False,
+        )
+        return row
+
+    # -----------------------
+    # Request handling
+    # -----------------------
+    def stats(self):
+        """Request counts by 'METHOD /path/ status', for checking what a benchmark actually sent."""
+        with self._lock:
+            return dict(self._stats)
+
+    def handle(self, method, target, headers, body):
+        """Returns (status, headers, payload) for one request; payload is None for an empty body."""
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == '/_fake/stats/':
+            return 200, {}, self.stats()
+
+        with self._lock:
+            delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0)
+            auth_failure = self._random.random() < self.auth_failure_rate
+            error = self._random.random() < self.error_rate
+            error_status = self._random.choice((500, 502, 503))
+        if delay:
+            time.sleep(delay)
+
+        if error:
+            response = error_status, {}, {'detail': 'Injected server error.'}
+        elif self.api_prefix != API_PREFIX and url.path.startswith(API_PREFIX):
+            location = self.api_prefix + url.path[len(API_PREFIX):] + (f'?{url.query}' if url.query else '')
+            response = 301, {'Location': location}, None
+        elif auth_failure or (url.path != f'{self.api_prefix}ping/' and not self._authorized(headers)):
+            # AAP answers /ping/ without a login
+            response = 401, {'WWW-Authenticate': 'Basic realm="api"'}, {'detail': 'Invalid username/password.'}
+        else:
+            response = self._route(method, url.path, query, headers, body)
+
+        with self._lock:
+            self._stats[f'{method} {url.path} {response[0]}'] += 1
+        return response
+
+    def _authorized(self, headers):
+        expected = 'Basic ' + base64.b64encode(f'{self.username}:{self.password}'.encode()).decode()
+        return headers.get('Authorization') == expected
+
+    def _route(self, method, path, query, headers, body):
+        if path == f'{self.api_prefix}ping/':
+            if method != 'GET':
+                return 405, {}, {'detail': f'Method "{method}" not allowed.'}
+            return 200, {}, {'ha': False, 'version': '4.5.0', 'active_node': 'fake-aap', 'instances': []}
+
+        parts = path[len(self.api_prefix):].strip('/').split('/') if path.startswith(self.api_prefix) else []
+        if not parts or parts[0] not in RESOURCES or len(parts) > 2:
+            return 404, {}, {'detail': 'Not found.'}
+        resource = parts[0]
+
+        if len(parts) == 2:
+            if method != 'GET':
+                return 405, {}, {'detail': f'Method "{method}" not allowed.'}
+            with self._lock:
+                row = next((row for row in self._rows[resource] if str(row['id']) == parts[1]), None)
+            if row is None:
+                return 404, {}, {'detail': 'Not found.'}
+            return self._conditional(headers, row)
+
+        if method == 'GET':
+            return self._list(path, resource, query, headers)
+        if method == 'POST':
+            return self._create(resource, body)
+        return 405, {}, {'detail': f'Method "{method}" not allowed.'}
+
+    def _list(self, path, resource, query, headers):
+        with self._lock:
+            rows = list(self._rows[resource])
+
+        for key, value in query.items():
+            if key == 'name':
+                rows = [row for row in rows if row['name'] == value]
+            elif key == 'name__icontains':
+                rows = [row for row in rows if value.lower() in row['name'].lower()]
+            elif key in ('modified__gt', 'modified__gte'):
+                # Same-format ISO timestamps in UTC compare correctly as strings
+                value = _timestamp(datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc))
+                rows = [row for row in rows if row['modified'] > value or (key == 'modified__gte' and row['modified'] == value)]
+        order_by = query.get('order_by', 'id')
+        field = order_by.lstrip('-')
+        if field in ('id', 'name', 'created', 'modified'):
+            rows.sort(key=lambda row: row[field], reverse=order_by.startswith('-'))
+
+        try:
+            page = max(int(query.get('page', 1)), 1)
+            page_size = min(max(int(query.get('page_size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return 400, {}, {'detail': 'Invalid page or page_size.'}
+        start = (page - 1) * page_size
+        if start and start >= len(rows):
+            return 404, {}, {'detail': 'Invalid page.'}
+
+        def link(number):
+            params = dict(query, page=number, page_size=page_size)
+            return f'{path}?{urlencode(params)}'
+
+        return self._conditional(headers, {
+            'count': len(rows),
+            'next': link(page + 1) if start + page_size < len(rows) else None,
+            'previous': link(page - 1) if page > 1 else None,
+            'results': rows[start:start + page_size],
+        })
+
+    def _create(self, resource, body):
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {}, {'detail': 'JSON parse error.'}
+        if not isinstance(data, dict) or not data.get('name'):
+            return 400, {}, {'name': ['This field is required.']}
+
+        with self._lock:
+            rows = self._rows[resource]
+            if resource == 'credential_types' and any(row['name'] == data['name'] for row in rows):
+                return 400, {}, {'__all__': ['Credential Type with this Name and Kind already exists.']}
+            pk = max((row['id'] for row in rows), default=0) + 1
+            row = self._base(pk, resource[:-1], data['name'])
+            row.update(data, id=pk)
+            row['created'] = row['modified'] = _timestamp(datetime.now(timezone.utc))
+            rows.append(row)
+        return 201, {}, row
+
+    def _conditional(self, headers, payload):
+        if not self.etags:
+            return 200, {}, payload
+        etag = '"%s"' % md5(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        if headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, None
+        return 200, {'ETag': etag}, payload
+
+
+class FakeAAPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like a real AAP behind its proxy
+    server_version = 'FakeAAP'
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, headers, payload = self.server.aap.handle(self.command, self.path, self.headers, body)
+
+        content = b'' if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        if payload is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class FakeAAPServer(ThreadingHTTPServer):
+    """Threaded HTTP server for one FakeAAP; port 0 picks a free port (see .url)."""
+    daemon_threads = True
+    request_queue_size = 256  # benchmarks open many connections at once
+
+    def __init__(self, address, aap, verbose=False):
+        super().__init__(address, FakeAAPHandler)
+        self.aap = aap
+        self.verbose = verbose
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serves from a daemon thread and returns immediately."""
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-aap', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,28 @@
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def filter_audit_logs(queryset, params):
+    """Applies the audit log query filters shared by the list and export endpoints.
+
+    Supported: user, action, object_type, object_id, since and until (ISO 8601,
+    inclusive) and after_id (exclusive, for resuming exports).
+    """
+    for field in ('user', 'action', 'object_type'):
+        if params.get(field):
+            queryset = queryset.filter(**{field: params[field]})
+
+    for param, lookup in (('object_id', 'object_id'), ('after_id', 'id__gt')):
+        if params.get(param):
+            try:
+                queryset = queryset.filter(**{lookup: int(params[param])})
+            except ValueError:
+                raise ValidationError({param: 'Must be an integer.'})
+
+    for param, lookup in (('since', 'timestamp__gte'), ('until', 'timestamp__lte')):
+        if params.get(param):
+            value = parse_datetime(params[param])
+            if value is None:
+                raise ValidationError({param: 'Must be an ISO 8601 timestamp.'})
+            queryset = queryset.filter(**{lookup: value})
+    return queryset
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+DEFAULTS = {
+    'ALGORITHM': 'pbkdf2_sha256',
+    'PBKDF2_ITERATIONS': hashers.PBKDF2PasswordHasher.iterations,
+    'SCRYPT_WORK_FACTOR': hashers.ScryptPasswordHasher.work_factor,
+    'ARGON2_TIME_COST': hashers.Argon2PasswordHasher.time_cost,
+    'ARGON2_MEMORY_COST': hashers.Argon2PasswordHasher.memory_cost,
+    'BCRYPT_ROUNDS': hashers.BCryptSHA256PasswordHasher.rounds,
+}
+
+
+def hashing_settings():
+    """Returns the PASSWORD_HASHING settings merged over the defaults."""
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, 'PASSWORD_HASHING', {}))
+    return conf
+
+
+# Same algorithm names as Django's hashers, so existing hashes keep verifying;
+# a stored hash made with a different cost (or a non-preferred algorithm) is
+# re-encoded by check_password() on the user's next successful login.
+
+class TunablePBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return hashing_settings()['PBKDF2_ITERATIONS']
+
+
+class TunableScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return hashing_settings()['SCRYPT_WORK_FACTOR']
+
+
+class TunableArgon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Needs argon2-cffi."""
+
+    @property
+    def time_cost(self):
+        return hashing_settings()['ARGON2_TIME_COST']
+
+    @property
+    def memory_cost(self):
+        return hashing_settings()['ARGON2_MEMORY_COST']
+
+
+class TunableBCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """Needs bcrypt."""
+
+    @property
+    def rounds(self):
+        return hashing_settings()['BCRYPT_ROUNDS']
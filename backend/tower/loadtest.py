@@ -0,0 +1,307 @@
+"""Load-testing harness behind `python manage.py benchmark_api`.
+
+A scenario is a flow of API requests (log in, list, one CRUD round trip, ...)
+that worker threads repeat at a given concurrency. Every request is recorded
+under its route label, e.g. 'GET /api/credentials/{id}/', with its latency,
+status, response size and, when the app runs in-process, the number of SQL
+queries it issued. summarize() turns the samples into a JSON-serializable
+report, and compare() diffs two reports so runs can be held against a
+stored baseline.
+"""
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import warnings
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from .audit import audit_writer
+
+
+class Result:
+    __slots__ = ('status', 'body', 'elapsed', 'queries')
+
+    def __init__(self, status, body, elapsed, queries):
+        self.status = status
+        self.body = body
+        self.elapsed = elapsed  # milliseconds
+        self.queries = queries  # None when the server is not in this process
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class InProcessTransport:
+    """Calls the app through Django's test client, in this process, counting SQL queries."""
+    counts_queries = True
+
+    def __init__(self):
+        self._local = threading.local()
+        self.token = None
+
+    def request(self, method, path, data=None, auth=True):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client()
+        headers = {'Authorization': f'Bearer {self.token}'} if auth and self.token else {}
+        body = json.dumps(data) if data is not None else ''
+
+        with CaptureQueriesContext(connection) as queries, warnings.catch_warnings():
+            # The async views' streams are consumed synchronously here, as under WSGI
+            warnings.filterwarnings('ignore', message='StreamingHttpResponse must consume')
+            started = time.perf_counter()
+            response = client.generic(method, path, body, content_type='application/json', headers=headers)
+            content = b''.join(response) if response.streaming else response.content
+            elapsed = (time.perf_counter() - started) * 1000
+        return Result(response.status_code, content, elapsed, len(queries))
+
+    def close_thread(self):
+        connections.close_all()
+
+
+class HTTPTransport:
+    """Calls a running server over HTTP; one keep-alive session per worker thread."""
+    counts_queries = False
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self._local = threading.local()
+        self.token = None
+
+    def request(self, method, path, data=None, auth=True):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        headers = {'Authorization': f'Bearer {self.token}'} if auth and self.token else {}
+
+        started = time.perf_counter()
+        response = session.request(method, self.base_url + path, json=data, headers=headers, timeout=60)
+        content = response.content
+        elapsed = (time.perf_counter() - started) * 1000
+        return Result(response.status_code, content, elapsed, None)
+
+    def close_thread(self):
+        session = getattr(self._local, 'session', None)
+        if session is not None:
+            session.close()
+
+
+class Recorder:
+    """Sends requests through a transport and keeps the samples of each route label."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.recording = True
+        self._samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __call__(self, label, method, path, data=None, auth=True):
+        try:
+            result = self.transport.request(method, path, data, auth)
+        except requests.exceptions.RequestException as e:
+            result = Result(None, str(e).encode(), 0.0, None)
+        if self.recording:
+            with self._lock:
+                self._samples[label].append((result.elapsed, result.status, len(result.body), result.queries))
+        return result
+
+    def samples(self):
+        with self._lock:
+            return {label: list(samples) for label, samples in self._samples.items()}
+
+
+# -----------------------
+# Scenarios
+# -----------------------
+def login_flow(call, ctx, n):
+    response = call('POST /api/login/', 'POST', '/api/login/',
+                    {'username': ctx['username'], 'password': ctx['password']}, auth=False)
+    if response.status == 200:
+        call('POST /api/refresh/', 'POST', '/api/refresh/', {'refresh': response.json()['refresh']}, auth=False)
+
+
+def list_flow(call, ctx, n):
+    call('GET /api/instances/', 'GET', '/api/instances/')
+    call('GET /api/credentials/', 'GET', '/api/credentials/?page_size=100')
+    call('GET /api/credentials/?expand=tower_instance', 'GET', '/api/credentials/?expand=tower_instance')
+    call('GET /api/environments/', 'GET', '/api/environments/')
+
+
+def crud_flow(call, ctx, n):
+    response = call('POST /api/credentials/', 'POST', '/api/credentials/', {
+        'name': f'benchmark-{threading.get_ident()}-{n}',
+        'type': 'machine',
+        'username': 'benchmark',
+        'password': 'benchmark',
+        'tower_instance': ctx['instance_id'],
+    })
+    if response.status != 201:
+        return
+    path = f"/api/credentials/{response.json()['id']}/"
+    call('GET /api/credentials/{id}/', 'GET', path)
+    call('PATCH /api/credentials/{id}/', 'PATCH', path, {'username': 'benchmark-updated'})
+    call('DELETE /api/credentials/{id}/', 'DELETE', path)
+
+
+def audit_flow(call, ctx, n):
+    call('GET /api/audit-logs/', 'GET', '/api/audit-logs/?page_size=100')
+    call('GET /api/audit-logs/?action=', 'GET', '/api/audit-logs/?action=updated&page_size=100')
+    call('GET /api/audit-logs/?object_type=', 'GET', '/api/audit-logs/?object_type=Credential&page_size=100')
+    call('GET /api/audit-logs/export/', 'GET', '/api/audit-logs/export/')
+    call('GET /api/audit-logs/export/?output=csv&gzip=1', 'GET', '/api/audit-logs/export/?output=csv&gzip=1&action=updated')
+
+
+def tower_flow(call, ctx, n):
+    call('GET /api/tower-credentials/', 'GET', '/api/tower-credentials/')
+    if ctx.get('mirror_instance_id'):
+        call('GET /api/tower-credentials/?instance=', 'GET',
+             f"/api/tower-credentials/?instance={ctx['mirror_instance_id']}")
+    if ctx.get('aap_url'):
+        call('POST /api/test-connection/', 'POST', '/api/test-connection/', {
+            'url': ctx['aap_url'], 'username': ctx['aap_username'], 'password': ctx['aap_password'],
+        })
+
+
+SCENARIOS = {
+    'login': login_flow,
+    'list': list_flow,
+    'crud': crud_flow,
+    'audit': audit_flow,
+    'tower': tower_flow,
+}
+
+
+def run_scenario(transport, flow, ctx, iterations, concurrency, warmup=0):
+    """Runs flow iterations times on concurrency threads; returns (elapsed seconds, samples by label)."""
+    call = Recorder(transport)
+
+    def worker(numbers):
+        try:
+            for n in numbers:
+                flow(call, ctx, n)
+        finally:
+            transport.close_thread()
+
+    def run(count):
+        # Iterations are dealt round-robin so every thread gets an equal share
+        chunks = [range(i, count, concurrency) for i in range(concurrency)]
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, chunks))
+
+    if warmup:
+        call.recording = False
+        run(warmup)
+        call.recording = True
+    started = time.perf_counter()
+    run(iterations)
+    return time.perf_counter() - started, call.samples()
+
+
+# -----------------------
+# Scratch database
+# -----------------------
+@contextmanager
+def scratch_database():
+    """Points the default connection at a freshly migrated throwaway database, as the test runner does.
+
+    Benchmarks seed and write what they like without touching the configured database.
+    """
+    db = settings.DATABASES['default']
+    scratch = tempfile.mkdtemp(prefix='benchmark_')
+    if connection.vendor == 'sqlite':
+        # A file, not the in-memory default, so concurrent writers behave as in production
+        db.setdefault('TEST', {})['NAME'] = os.path.join(scratch, 'benchmark.sqlite3')
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        audit_writer.flush()
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+# -----------------------
+# Reports
+# -----------------------
+def percentile(values, q):
+    """Nearest-rank percentile of an unsorted list, q in [0, 100]."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(len(ordered) * q / 100.0)) - 1))]
+
+
+def latency_stats(timings):
+    """Mean, p50/p95/p99 and max of a list of millisecond timings, rounded for reports."""
+    return {
+        'mean_ms': round(statistics.mean(timings), 2),
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'max_ms': round(max(timings), 2),
+    }
+
+
+def summarize(elapsed, iterations, samples):
+    """Scenario report: totals plus latency, status, size and query statistics per route."""
+    endpoints = {}
+    for label, rows in sorted(samples.items()):
+        timings = [row[0] for row in rows]
+        statuses = Counter(str(row[1]) for row in rows)
+        queries = [row[3] for row in rows if row[3] is not None]
+        endpoints[label] = {
+            'count': len(rows),
+            'errors': sum(1 for row in rows if row[1] is None or row[1] >= 400),
+            'statuses': dict(statuses),
+            'throughput': round(len(rows) / elapsed, 2),
+            **latency_stats(timings),
+            'bytes_mean': round(statistics.mean(row[2] for row in rows)),
+            'queries_mean': round(statistics.mean(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None,
+        }
+    total = sum(endpoint['count'] for endpoint in endpoints.values())
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'iterations': iterations,
+        'requests': total,
+        'throughput': round(total / elapsed, 2),
+        'endpoints': endpoints,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Diffs the endpoints of two reports.
+
+    Returns a list of (scenario, label, metric, baseline value, current value,
+    regressed) rows. p95 latency regresses when it grows by more than
+    tolerance (a fraction) and at least a millisecond; mean query count
+    regresses when it grows by a whole query or more.
+    """
+    rows = []
+    for scenario, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if previous is None:
+            continue
+        for label, endpoint in current['endpoints'].items():
+            before = previous['endpoints'].get(label)
+            if before is None:
+                continue
+            old, new = before['p95_ms'], endpoint['p95_ms']
+            rows.append((scenario, label, 'p95_ms', old, new, new > old * (1 + tolerance) and new - old >= 1))
+            old, new = before.get('queries_mean'), endpoint.get('queries_mean')
+            if old is not None and new is not None:
+                rows.append((scenario, label, 'queries_mean', old, new, new - old >= 1))
+    return rows
@@ -0,0 +1,228 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from tower.fake_aap import FakeAAP, FakeAAPServer
+from tower.hashers import hashing_settings
+from tower.loadtest import (
+    SCENARIOS, HTTPTransport, InProcessTransport, compare, run_scenario, scratch_database, summarize,
+)
+from tower.models import AuditLog, Credential, ExecutionEnvironment, TowerConfig, TowerInstance
+from tower.sync import sync_instance
+
+BENCHMARK_USER = '__benchmark_api__'
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the REST API: runs login, list, CRUD, audit-log and Tower-proxy scenarios at the given "
+        "concurrency and reports throughput, p50/p95/p99 latency and SQL queries per endpoint. By default the "
+        "app runs in-process on a scratch database seeded with --instances/--credentials/--audit-logs rows, "
+        "with Tower calls answered by a local fake AAP. --url benchmarks a running server instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=list(SCENARIOS),
+                            help="Scenario to run (repeatable; default all).")
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help="Parallel clients (default 8).")
+        parser.add_argument('--iterations', type=int, default=200,
+                            help="Flows run per scenario (default 200).")
+        parser.add_argument('--warmup', type=int, default=10,
+                            help="Unrecorded flows run before each scenario (default 10).")
+        parser.add_argument('--instances', type=int, default=20,
+                            help="Tower instances seeded into the scratch database (default 20).")
+        parser.add_argument('--credentials', type=int, default=2000,
+                            help="Credentials and Tower-side credentials seeded (default 2000).")
+        parser.add_argument('--audit-logs', type=int, default=20000,
+                            help="Audit log entries seeded (default 20000).")
+        parser.add_argument('--tower-latency', type=float, default=50, metavar='MS',
+                            help="Response latency of the fake AAP (default 50).")
+        parser.add_argument('--url',
+                            help="Benchmark the server at this base URL (e.g. http://127.0.0.1:8000) "
+                                 "with its own data; query counts are not available.")
+        parser.add_argument('--username', help="Login used with --url.")
+        parser.add_argument('--password', help="Password used with --url.")
+        parser.add_argument('--output', metavar='FILE', help="Write the report as JSON.")
+        parser.add_argument('--baseline', metavar='FILE', help="Compare with a report written by --output.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed relative p95 growth over the baseline (default 0.25).")
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help="Exit with an error when the comparison finds a regression.")
+
+    def handle(self, *args, **options):
+        if options['url'] and not (options['username'] and options['password']):
+            raise CommandError("--url needs --username and --password.")
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        scenarios = options['scenarios'] or list(SCENARIOS)
+        aap = FakeAAPServer(('127.0.0.1', 0), FakeAAP(
+            credentials=options['credentials'], latency=options['tower_latency'] / 1000,
+        )).start()
+        try:
+            if options['url']:
+                report = self._run_remote(scenarios, aap, options)
+            else:
+                with scratch_database():
+                    report = self._run_in_process(scenarios, aap, options)
+        finally:
+            aap.stop()
+
+        self._print(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"\nreport written to {options['output']}")
+        if baseline is not None:
+            self._compare(report, baseline, options)
+
+    # -----------------------
+    # Runs
+    # -----------------------
+    def _run_in_process(self, scenarios, aap, options):
+        self.stdout.write("seeding scratch database...")
+        ctx = self._seed(aap, options)
+        transport = InProcessTransport()
+
+        # Throttling would refuse most of the login scenario's own attempts
+        with override_settings(LOGIN_THROTTLE={'ENABLED': False}):
+            transport.token = transport.request(
+                'POST', '/api/login/', {'username': ctx['username'], 'password': ctx['password']}, auth=False
+            ).json()['access']
+            return self._run(transport, scenarios, ctx, options, mode='in-process')
+
+    def _run_remote(self, scenarios, aap, options):
+        transport = HTTPTransport(options['url'])
+        response = transport.request(
+            'POST', '/api/login/', {'username': options['username'], 'password': options['password']}, auth=False
+        )
+        if response.status != 200:
+            raise CommandError(f"Login to {options['url']} failed with {response.status}.")
+        transport.token = response.json()['access']
+
+        instances = transport.request('GET', '/api/instances/?page_size=1').json()['results']
+        if not instances and 'crud' in scenarios:
+            raise CommandError("The crud scenario needs at least one Tower instance on the server.")
+        ctx = {
+            'username': options['username'],
+            'password': options['password'],
+            'instance_id': instances[0]['id'] if instances else None,
+            'mirror_instance_id': instances[0]['id'] if instances else None,
+            # Only useful when the server can reach this machine
+            'aap_url': aap.url,
+            'aap_username': aap.aap.username,
+            'aap_password': aap.aap.password,
+        }
+        return self._run(transport, scenarios, ctx, options, mode=options['url'])
+
+    def _run(self, transport, scenarios, ctx, options, mode):
+        report = {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(),
+                'mode': mode,
+                'database': connection.vendor if mode == 'in-process' else None,
+                'concurrency': options['concurrency'],
+                'iterations': options['iterations'],
+                'tower_latency_ms': options['tower_latency'],
+                'hasher': hashing_settings()['ALGORITHM'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'scenarios': {},
+        }
+        for name in scenarios:
+            self.stdout.write(f"running {name}...")
+            self.stdout.flush()
+            elapsed, samples = run_scenario(
+                transport, SCENARIOS[name], ctx, options['iterations'], options['concurrency'], options['warmup']
+            )
+            report['scenarios'][name] = summarize(elapsed, options['iterations'], samples)
+        return report
+
+    def _seed(self, aap, options):
+        User = get_user_model()
+        User.objects.create_user(BENCHMARK_USER, password=BENCHMARK_PASSWORD, role='admin')
+
+        instances = TowerInstance.objects.bulk_create(
+            TowerInstance(name=f'bench-{n}', url=f'https://tower-{n}.example.com', username='admin',
+                          password='password', region='bench', environment='bench')
+            for n in range(max(options['instances'], 1))
+        )
+        Credential.objects.bulk_create(
+            (Credential(name=f'credential-{n}', type='machine', username=f'user{n}', password='secret',
+                        tower_instance=instances[n % len(instances)]) for n in range(options['credentials'])),
+            batch_size=1000,
+        )
+        ExecutionEnvironment.objects.bulk_create(
+            ExecutionEnvironment(name=f'ee-{n}', image=f'https://quay.io/example/ee-{n}',
+                                 tower_instance=instances[n % len(instances)])
+            for n in range(len(instances) * 5)
+        )
+        actions = ('created', 'updated', 'deleted')
+        AuditLog.objects.bulk_create(
+            (AuditLog(user=BENCHMARK_USER, action=actions[n % 3], object_type='Credential', object_id=n,
+                      object_repr=f'credential-{n}', changes={}) for n in range(options['audit_logs'])),
+            batch_size=1000,
+        )
+
+        TowerConfig.objects.create(base_url=aap.url, username=aap.aap.username, password=aap.aap.password)
+        mirrored = TowerInstance.objects.create(
+            name='bench-fake-aap', url=aap.url, username=aap.aap.username, password=aap.aap.password
+        )
+        sync_instance(mirrored, ['credentials'])
+
+        return {
+            'username': BENCHMARK_USER,
+            'password': BENCHMARK_PASSWORD,
+            'instance_id': instances[0].pk,
+            'mirror_instance_id': mirrored.pk,
+            'aap_url': aap.url,
+            'aap_username': aap.aap.username,
+            'aap_password': aap.aap.password,
+        }
+
+    # -----------------------
+    # Output
+    # -----------------------
+    def _print(self, report):
+        meta = report['meta']
+        self.stdout.write(
+            f"\n{meta['mode']}, {meta['concurrency']} clients, {meta['iterations']} iterations per scenario"
+        )
+        for name, scenario in report['scenarios'].items():
+            self.stdout.write(
+                f"\n{name}: {scenario['requests']} requests in {scenario['elapsed_s']:.2f}s "
+                f"= {scenario['throughput']:.1f} req/s"
+            )
+            self.stdout.write(
+                f"  {'endpoint':<48}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'errors':>8}"
+            )
+            for label, endpoint in scenario['endpoints'].items():
+                queries = '-' if endpoint['queries_mean'] is None else f"{endpoint['queries_mean']:.1f}"
+                self.stdout.write(
+                    f"  {label:<48}{endpoint['throughput']:>8.1f}{endpoint['p50_ms']:>9.1f}"
+                    f"{endpoint['p95_ms']:>9.1f}{endpoint['p99_ms']:>9.1f}{queries:>9}{endpoint['errors']:>8}"
+                )
+
+    def _compare(self, report, baseline, options):
+        rows = compare(report, baseline, options['tolerance'])
+        self.stdout.write(f"\ncompared with baseline of {baseline.get('meta', {}).get('created', '?')}:")
+        regressions = 0
+        for scenario, label, metric, old, new, regressed in rows:
+            change = f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+            flag = '  REGRESSION' if regressed else ''
+            regressions += regressed
+            self.stdout.write(f"  {scenario:<7}{label:<48}{metric:<14}{old:>9}{new:>9}{change:>8}{flag}")
+        self.stdout.write(f"{regressions} regression(s).")
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"{regressions} regression(s) against {options['baseline']}.")
@@ -0,0 +1,101 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from tower.hashers import hashing_settings
+from tower.loadtest import latency_stats, scratch_database
+from tower.views import login_view, refresh_view
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the server-side cost of signing in (password hash) with refreshing a token pair, "
+        "and measures login throughput with --concurrency parallel clients. Runs on a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50,
+                            help="Requests timed per endpoint (default 50).")
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help="Parallel login clients for the throughput run, e.g. the worker count (default 1).")
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        concurrency = max(1, options['concurrency'])
+        factory = APIRequestFactory()
+        username, password = '__benchmark_auth__', 'benchmark-password'
+        User = get_user_model()
+
+        conf = hashing_settings()
+        self.stdout.write(f"hasher: {conf['ALGORITHM']} ({self._cost(conf)})")
+
+        def login():
+            request = factory.post('/api/login/', {'username': username, 'password': password}, format='json')
+            return login_view(request).data
+
+        # Throttling would refuse most of the benchmark's own attempts
+        with scratch_database(), override_settings(LOGIN_THROTTLE={'ENABLED': False}):
+            User.objects.create_user(username, password=password, role='viewer')
+            refresh_token = login()['refresh']
+
+            def refresh():
+                nonlocal refresh_token
+                request = factory.post('/api/refresh/', {'refresh': refresh_token}, format='json')
+                data = refresh_view(request).data
+                refresh_token = data.get('refresh', refresh_token)
+                return data
+
+            results = {'login': self._time(login, iterations), 'refresh': self._time(refresh, iterations)}
+            throughput, loaded = self._throughput(login, iterations, concurrency)
+
+        self.stdout.write(f"{'endpoint':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, timings in results.items():
+            self._row(name, timings)
+        ratio = statistics.mean(results['login']) / statistics.mean(results['refresh'])
+        self.stdout.write(f"login costs {ratio:.1f}x a refresh")
+
+        self.stdout.write(f"\n{concurrency} concurrent login clients:")
+        self._row('login', loaded)
+        self.stdout.write(f"throughput: {throughput:.1f} logins/s")
+
+    @staticmethod
+    def _cost(conf):
+        return {
+            'pbkdf2_sha256': f"iterations={conf['PBKDF2_ITERATIONS']}",
+            'scrypt': f"work_factor={conf['SCRYPT_WORK_FACTOR']}",
+            'argon2': f"time_cost={conf['ARGON2_TIME_COST']}, memory_cost={conf['ARGON2_MEMORY_COST']}",
+            'bcrypt_sha256': f"rounds={conf['BCRYPT_ROUNDS']}",
+        }.get(conf['ALGORITHM'], 'default cost')
+
+    def _throughput(self, call, iterations, concurrency):
+        def timed(_):
+            try:
+                started = time.perf_counter()
+                call()
+                return (time.perf_counter() - started) * 1000
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = list(pool.map(timed, range(iterations)))
+        return iterations / (time.perf_counter() - started), timings
+
+    def _row(self, name, timings):
+        stats = latency_stats(timings)
+        self.stdout.write(f"{name:<10}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}")
+
+    @staticmethod
+    def _time(call, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
@@ -0,0 +1,109 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+
+from tower.loadtest import latency_stats
+from tower.models import AuditLog
+
+BENCHMARK_USER = '__benchmark_db_writes__'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures write throughput with concurrent writers, each committing audit-log sized transactions "
+        "against the configured database. --compare runs the same load on scratch SQLite files with and "
+        "without the WAL tuning."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8,
+                            help="Concurrent writer threads (default 8).")
+        parser.add_argument('--writes', type=int, default=200,
+                            help="Transactions per writer (default 200).")
+        parser.add_argument('--compare', action='store_true',
+                            help="Benchmark scratch SQLite databases with SQLITE_WAL=0 and SQLITE_WAL=1.")
+        parser.add_argument('--migrate', action='store_true',
+                            help="Migrate the configured database first (used by --compare on its scratch files).")
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            return self._compare(options)
+
+        if options['migrate']:
+            call_command('migrate', verbosity=0)
+
+        vendor = connection.vendor
+        if vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                mode = f"sqlite, journal_mode={cursor.fetchone()[0]}"
+        else:
+            mode = vendor
+
+        errors = []
+        errors_lock = threading.Lock()
+
+        def writer(index):
+            timings = []
+            try:
+                for n in range(options['writes']):
+                    started = time.perf_counter()
+                    try:
+                        # One row plus its table-version bump, like a CRUD request
+                        with transaction.atomic():
+                            AuditLog.objects.create(
+                                user=BENCHMARK_USER, action='created', object_type='Benchmark',
+                                object_id=index * options['writes'] + n, object_repr='benchmark row',
+                            )
+                    except OperationalError as e:
+                        with errors_lock:
+                            errors.append(e)
+                        continue
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+            return timings
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['writers']) as pool:
+                timings = [t for result in pool.map(writer, range(options['writers'])) for t in result]
+            elapsed = time.perf_counter() - started
+        finally:
+            AuditLog.objects.filter(user=BENCHMARK_USER).delete()
+
+        self.stdout.write(f"{mode}: {options['writers']} writers x {options['writes']} transactions")
+        if timings:
+            stats = latency_stats(timings)
+            self.stdout.write(
+                f"  committed {len(timings)} in {elapsed:.2f}s = {len(timings) / elapsed:.0f} tx/s, "
+                f"latency mean {stats['mean_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms"
+            )
+        self.stdout.write(f"  failed (database locked or similar): {len(errors)}")
+
+    def _compare(self, options):
+        manage_py = os.path.join(settings.BASE_DIR, 'manage.py')
+        with tempfile.TemporaryDirectory() as scratch:
+            for wal in ('0', '1'):
+                env = dict(
+                    os.environ,
+                    DB_ENGINE='sqlite',
+                    DB_NAME=os.path.join(scratch, f'bench-wal{wal}.sqlite3'),
+                    SQLITE_WAL=wal,
+                )
+                self.stdout.write(f"SQLITE_WAL={wal}")
+                self.stdout.flush()
+                subprocess.run(
+                    [sys.executable, manage_py, 'benchmark_db_writes', '--migrate',
+                     '--writers', str(options['writers']), '--writes', str(options['writes'])],
+                    env=env, check=True,
+                )
@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from tower.audit_export import iter_audit_export
+from tower.filters import filter_audit_logs
+from tower.models import AuditLog
+
+
+class Command(BaseCommand):
+    help = "Streams the audit log as NDJSON or CSV, optionally gzipped, in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--file', help="Write to this file instead of stdout.")
+        parser.add_argument('--after-id', type=int, help="Resume after this audit log id.")
+        parser.add_argument('--user')
+        parser.add_argument('--action')
+        parser.add_argument('--object-type')
+        parser.add_argument('--object-id', type=int)
+        parser.add_argument('--since', help="ISO 8601 timestamp (inclusive).")
+        parser.add_argument('--until', help="ISO 8601 timestamp (inclusive).")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        params = {
+            key: str(options[key])
+            for key in ('user', 'action', 'object_type', 'object_id', 'since', 'until', 'after_id')
+            if options[key] is not None
+        }
+        try:
+            queryset = filter_audit_logs(AuditLog.objects.all(), params)
+        except ValidationError as e:
+            raise CommandError(e.detail)
+        chunks = iter_audit_export(queryset, options['output'], options['gzip'], options['chunk_size'])
+
+        out = open(options['file'], 'wb') if options['file'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if options['file']:
+                out.close()
+            else:
+                out.flush()
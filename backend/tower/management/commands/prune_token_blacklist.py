@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tower.blacklist import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Deletes expired outstanding and blacklisted JWTs in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Rows per DELETE (default TOKEN_BLACKLIST['PRUNE_BATCH_SIZE']).")
+        parser.add_argument('--loop', type=int, default=0, metavar='SECONDS',
+                            help="Keep running as a worker, pruning every SECONDS.")
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = prune_expired_tokens(options['batch_size'])
+            self.stdout.write(f"Pruned {deleted} expired tokens")
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,96 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tower.fake_aap import FakeAAP, FakeAAPServer
+from tower.models import TowerConfig, TowerInstance
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves one or more fake AAP APIs (ping, credentials, credential types, execution environments) "
+        "with a generated inventory and injected latency, errors and auth failures, for offline testing "
+        "and benchmarks of the Tower integration."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8052,
+                            help="Port of the first server; further servers use the following ports (default 8052).")
+        parser.add_argument('--towers', type=int, default=1,
+                            help="Number of fake AAP servers to run (default 1).")
+        parser.add_argument('--credentials', type=int, default=100)
+        parser.add_argument('--credential-types', type=int, default=30)
+        parser.add_argument('--execution-environments', type=int, default=10)
+        parser.add_argument('--username', default='admin')
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--latency', type=float, default=0.0, metavar='MS',
+                            help="Delay added to every response, in milliseconds.")
+        parser.add_argument('--jitter', type=float, default=0.0, metavar='MS',
+                            help="Random extra delay of up to MS milliseconds per response.")
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help="Fraction of requests answered with a 500, 502 or 503.")
+        parser.add_argument('--auth-failure-rate', type=float, default=0.0,
+                            help="Fraction of requests answered with a 401 even with valid credentials.")
+        parser.add_argument('--etags', action='store_true',
+                            help="Send ETags and answer If-None-Match with 304 (real AAP does not).")
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Seed of the failure and jitter draws; server N uses seed + N.")
+        parser.add_argument('--register', action='store_true',
+                            help="Create or update a TowerInstance 'fake-aap-N' per server, "
+                                 "and a TowerConfig for the first one if none exists.")
+        parser.add_argument('--verbose-requests', action='store_true',
+                            help="Log every request.")
+
+    def handle(self, *args, **options):
+        for name in ('error_rate', 'auth_failure_rate'):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be between 0 and 1.")
+
+        servers = []
+        try:
+            for n in range(options['towers']):
+                aap = FakeAAP(
+                    credentials=options['credentials'],
+                    credential_types=options['credential_types'],
+                    execution_environments=options['execution_environments'],
+                    username=options['username'],
+                    password=options['password'],
+                    latency=options['latency'] / 1000,
+                    jitter=options['jitter'] / 1000,
+                    error_rate=options['error_rate'],
+                    auth_failure_rate=options['auth_failure_rate'],
+                    etags=options['etags'],
+                    seed=options['seed'] + n,
+                )
+                port = options['port'] + n if options['port'] else 0
+                try:
+                    server = FakeAAPServer((options['host'], port), aap, verbose=options['verbose_requests'])
+                except OSError as e:
+                    raise CommandError(f"Cannot listen on {options['host']}:{port}: {e}")
+                servers.append(server.start())
+                self.stdout.write(f"fake-aap-{n + 1}: {server.url}")
+
+            if options['register']:
+                self._register(servers, options)
+
+            self.stdout.write("Serving; stop with Ctrl-C.")
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for server in servers:
+                server.stop()
+
+    def _register(self, servers, options):
+        for n, server in enumerate(servers, start=1):
+            TowerInstance.objects.update_or_create(
+                name=f'fake-aap-{n}',
+                defaults={'url': server.url, 'username': options['username'], 'password': options['password']},
+            )
+        if not TowerConfig.objects.exists():
+            TowerConfig.objects.create(
+                base_url=servers[0].url, username=options['username'], password=options['password']
+            )
+        self.stdout.write(f"Registered {len(servers)} Tower instance(s).")
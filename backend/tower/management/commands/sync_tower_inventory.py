@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tower.models import TowerInstance
+from tower.sync import RESOURCES, sync_instance
+
+
+class Command(BaseCommand):
+    help = "Mirrors credentials, credential types and execution environments from every TowerInstance into local tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--instance', action='append', dest='instances', metavar='NAME',
+                            help="Only sync this instance (repeatable).")
+        parser.add_argument('--resource', action='append', dest='resources', choices=list(RESOURCES),
+                            help="Only sync this resource (repeatable).")
+        parser.add_argument('--full', action='store_true',
+                            help="Ignore watermarks, re-read everything and drop rows deleted remotely.")
+        parser.add_argument('--loop', type=int, default=0, metavar='SECONDS',
+                            help="Keep running as a worker, syncing every SECONDS.")
+
+    def handle(self, *args, **options):
+        instances = TowerInstance.objects.all()
+        if options['instances']:
+            instances = instances.filter(name__in=options['instances'])
+            if not instances.exists():
+                raise CommandError("No matching Tower instances.")
+
+        while True:
+            for instance in instances.all():
+                results = sync_instance(instance, options['resources'], full=options['full'])
+                for resource, result in results.items():
+                    if isinstance(result, Exception):
+                        self.stderr.write(f"{instance.name} {resource}: {result}")
+                    else:
+                        self.stdout.write(f"{instance.name} {resource}: {result} rows")
+
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
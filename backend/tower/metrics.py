@@ -0,0 +1,552 @@
+"""Request metrics in Prometheus text format.
+
+MetricsMiddleware times every request and records, per route and method, a
+latency histogram, a response size histogram, status counts and an in-flight
+gauge. Routes are URL patterns ('/api/instances/{pk}/'), not paths, so the
+number of series stays bounded. TowerClient and AsyncTowerClient report
+every outbound call through record_tower_call(), per Tower instance and API
+path, and tower_call_stats() summarizes those series for the admin API.
+
+Each worker process keeps its series in memory and rewrites a JSON snapshot
+of them in METRICS['DIRECTORY'] every FLUSH_INTERVAL seconds. metrics_view
+(/metrics) adds up the snapshots of every worker, so any worker can answer a
+scrape for the whole deployment. Gauges only count workers that are still
+writing. Counters and histograms of a worker that stopped writing RETENTION
+seconds ago are folded into a RETIRED_FILE aggregate, so totals never go down.
+"""
+import atexit
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import Resolver404, get_resolver
+from django.utils.crypto import constant_time_compare
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'DIRECTORY': None,       # where workers share snapshots; None keeps metrics per process
+    'FLUSH_INTERVAL': 5.0,   # seconds between snapshot writes
+    'RETENTION': 3600,       # seconds before an exited worker's snapshot is folded into RETIRED_FILE
+    'LATENCY_BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    'SIZE_BUCKETS': (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+    'EXCLUDE': ('/metrics',),
+    'ALLOWED_IPS': ('127.0.0.1', '::1'),  # scrapers allowed while no TOKEN is configured
+    'TOKEN': None,           # bearer token every scrape must then send
+}
+
+# Counters and histograms of exited workers, in DIRECTORY
+RETIRED_FILE = 'retired-workers.json'
+
+
+def metrics_settings():
+    """Returns the METRICS settings merged over the defaults."""
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, 'METRICS', {}))
+    return conf
+
+
+# name -> (type, help)
+METRICS = {
+    'tower_http_requests_total': ('counter', 'HTTP requests answered, by route, method and status.'),
+    'tower_http_request_duration_seconds': ('histogram', 'Time from request to last response byte.'),
+    'tower_http_response_size_bytes': ('histogram', 'Response body size.'),
+    'tower_http_requests_in_flight': ('gauge', 'Requests being processed, by route and method.'),
+    'tower_outbound_requests_total': ('counter', 'Calls to Tower, by Tower instance, API path, method and outcome.'),
+    'tower_outbound_request_duration_seconds': ('histogram', 'Duration of calls to Tower that reached the network.'),
+    'tower_outbound_received_bytes_total': ('counter', 'Response bytes received from Tower.'),
+    'tower_outbound_sent_bytes_total': ('counter', 'Request body bytes sent to Tower.'),
+    'tower_outbound_retries_total': ('counter', 'Transport-level retries of calls to Tower.'),
+}
+
+# Outcomes of a Tower call besides its status class ('2xx', '4xx', ...)
+TOWER_CALL_FAILURES = ('timeout', 'connection_error', 'error', 'circuit_open', 'busy')
+
+
+class MetricsRegistry:
+    """The series of one process, plus snapshot files shared with the other workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)    # (name, labels) -> value
+        self._gauges = defaultdict(float)
+        self._histograms = {}                  # (name, labels) -> [bucket counts..., sum, count]
+        self._buckets = {}                     # histogram name -> upper bounds
+        self._thread = None
+        self._pid = None
+        self._flushed_pid = None
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._counters[(name, labels)] += value
+        self._ensure_thread()
+
+    def add_gauge(self, name, labels, value):
+        with self._lock:
+            self._gauges[(name, labels)] += value
+        self._ensure_thread()
+
+    def observe(self, name, labels, value, buckets):
+        with self._lock:
+            self._buckets[name] = buckets
+            series = self._histograms.get((name, labels))
+            if series is None:
+                series = self._histograms[(name, labels)] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+        self._ensure_thread()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self._gauges.items()],
+                'histograms': [
+                    [name, list(labels), self._buckets[name], list(series)]
+                    for (name, labels), series in self._histograms.items()
+                ],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    # -----------------------
+    # Shared snapshots
+    # -----------------------
+    def _path(self, directory):
+        return os.path.join(directory, f'{socket.gethostname()}-{os.getpid()}.json')
+
+    def flush(self):
+        """Writes this process's snapshot to DIRECTORY (atomically, via rename)."""
+        directory = metrics_settings()['DIRECTORY']
+        if not directory:
+            return
+        path = self._path(directory)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if self._flushed_pid != os.getpid() and os.path.exists(path):
+                # Left by an exited process with the same pid; keep its totals as a retired snapshot
+                os.replace(path, path[:-len('.json')] + f'-{time.time_ns()}.json')
+            self._flushed_pid = os.getpid()
+            _write_json(path, self.snapshot())
+        except OSError as e:
+            logger.warning("Could not write metrics snapshot %s: %s", path, e)
+
+    def collect(self):
+        """Returns (merged snapshot of every worker, number of live workers)."""
+        conf = metrics_settings()
+        snapshots = [(self.snapshot(), True)]
+        directory = conf['DIRECTORY']
+        if directory and os.path.isdir(directory):
+            own = self._path(directory)
+            live_after = time.time() - 2 * conf['FLUSH_INTERVAL'] - 1
+            workers = []
+            for entry in os.scandir(directory):
+                if not entry.name.endswith('.json') or entry.path == own or entry.name == RETIRED_FILE:
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                    if mtime < time.time() - conf['RETENTION']:
+                        self._retire(directory, entry.name, mtime)
+                    with open(entry.path) as f:
+                        workers.append((entry.name, mtime, json.load(f)))
+                except (OSError, ValueError):
+                    continue  # being replaced or removed right now
+            # Read after the scan: a snapshot retired meanwhile is listed here and skipped below
+            retired = _read_retired(directory)
+            if retired['counters'] or retired['histograms']:
+                snapshots.append((retired, False))
+            for name, mtime, snapshot in workers:
+                if retired['workers'].get(name, -1) < mtime:
+                    snapshots.append((snapshot, mtime >= live_after))
+        return _merge(snapshots), sum(1 for _, live in snapshots if live)
+
+    def _retire(self, directory, name, mtime):
+        """Folds an exited worker's counters and histograms into RETIRED_FILE, then deletes its snapshot.
+
+        Workers take turns through a lock file; if another one holds it, the
+        snapshot is left for a later scrape. The aggregate remembers which
+        snapshots it already holds, so a crash between writing it and deleting
+        the snapshot does not count that worker twice.
+        """
+        lock = os.path.join(directory, RETIRED_FILE + '.lock')
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            try:
+                if os.stat(lock).st_mtime < time.time() - 60:
+                    os.remove(lock)  # left behind by a worker that died while holding it
+            except OSError:
+                pass
+            return
+        try:
+            retired = _read_retired(directory)
+            if retired['workers'].get(name, -1) < mtime:
+                with open(os.path.join(directory, name)) as f:
+                    snapshot = json.load(f)
+                counters, _, histograms = _merge([(retired, False), (snapshot, False)])
+                forget_before = time.time() - 2 * metrics_settings()['RETENTION']
+                workers = {worker: seen for worker, seen in retired['workers'].items() if seen >= forget_before}
+                workers[name] = mtime
+                _write_json(os.path.join(directory, RETIRED_FILE), {
+                    'counters': [[series, list(labels), value] for (series, labels), value in counters.items()],
+                    'gauges': [],
+                    'histograms': [[series, list(labels), buckets, values]
+                                   for (series, labels), (buckets, values) in histograms.items()],
+                    'workers': workers,
+                })
+            os.remove(os.path.join(directory, name))
+        finally:
+            os.remove(lock)
+
+    def shutdown(self):
+        """Writes a last snapshot at exit, if this process has been writing them."""
+        if self._pid == os.getpid():
+            self.flush()
+
+    def _ensure_thread(self):
+        # Re-created after a fork: the parent's thread does not survive in the child
+        if self._pid == os.getpid() or not metrics_settings()['DIRECTORY']:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(metrics_settings()['FLUSH_INTERVAL'])
+            self.flush()
+
+
+def _write_json(path, data):
+    # Atomic, via rename: readers see the old file or the new one
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(path + '.tmp', path)
+
+
+def _read_retired(directory):
+    try:
+        with open(os.path.join(directory, RETIRED_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'counters': [], 'gauges': [], 'histograms': [], 'workers': {}}
+
+
+def _series(name, labels):
+    # Snapshots written before the Tower label was renamed from 'instance'
+    if name.startswith('tower_outbound_'):
+        labels = [('tower_instance', value) if key == 'instance' else (key, value) for key, value in labels]
+    return name, tuple(map(tuple, labels))
+
+
+def _merge(snapshots):
+    counters, gauges, histograms = defaultdict(float), defaultdict(float), {}
+    for snapshot, live in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[_series(name, labels)] += value
+        if live:
+            for name, labels, value in snapshot['gauges']:
+                gauges[_series(name, labels)] += value
+        for name, labels, buckets, series in snapshot['histograms']:
+            key = _series(name, labels)
+            merged = histograms.get(key)
+            if merged is None or merged[0] != list(buckets):
+                # Snapshots with other buckets (reconfigured since) cannot be added up; keep one
+                histograms[key] = [list(buckets), list(series)]
+            else:
+                merged[1] = [a + b for a, b in zip(merged[1], series)]
+    return counters, gauges, histograms
+
+
+registry = MetricsRegistry()
+atexit.register(registry.shutdown)
+
+
+# -----------------------
+# Exposition
+# -----------------------
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render(metrics=None):
+    """Renders the merged series of every worker in Prometheus text format 0.0.4."""
+    (counters, gauges, histograms), workers = registry.collect()
+    lines = []
+    for name, (kind, help_text) in {**METRICS, **(metrics or {})}.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (series, labels), value in sorted(counters.items()):
+                if series == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+        elif kind == 'gauge':
+            for (series, labels), value in sorted(gauges.items()):
+                if series == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+        else:
+            for (series, labels), (buckets, values) in sorted(histograms.items()):
+                if series != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, values):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels, [("le", _number(bound))])} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {values[-1]}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(values[-2])}')
+                lines.append(f'{name}_count{_labels(labels)} {values[-1]}')
+    lines.append('# HELP tower_metrics_workers Worker processes whose gauges are included.')
+    lines.append('# TYPE tower_metrics_workers gauge')
+    lines.append(f'tower_metrics_workers {workers}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """GET /metrics: every worker's series, for Prometheus to scrape."""
+    conf = metrics_settings()
+    token = conf['TOKEN']
+    if token:
+        # Behind a reverse proxy every scrape comes from the proxy's address, so a
+        # configured token is never waived for ALLOWED_IPS
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden('Metrics require the bearer TOKEN.\n')
+    elif request.META.get('REMOTE_ADDR') not in conf['ALLOWED_IPS']:
+        return HttpResponseForbidden('Metrics are only served to ALLOWED_IPS.\n')
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# -----------------------
+# Outbound Tower calls
+# -----------------------
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def tower_path_label(path):
+    """'/api/v2/credentials/42/?page=3' or an absolute 'next' URL -> '/api/v2/credentials/{id}/'."""
+    path = urlsplit(path).path or '/'
+    return _ID_SEGMENT.sub('/{id}', path)
+
+
+def record_tower_call(instance, method, path, outcome, elapsed=None, sent=0, received=0, retries=0):
+    """Records one call made by a TowerClient or AsyncTowerClient.
+
+    outcome is the status class ('2xx' ... '5xx') or one of TOWER_CALL_FAILURES.
+    elapsed is None for calls refused before reaching the network.
+    """
+    # Not 'instance': Prometheus sets that label to the scraped target
+    labels = (('tower_instance', instance), ('method', method), ('path', tower_path_label(path)))
+    registry.inc('tower_outbound_requests_total', labels + (('outcome', outcome),))
+    if elapsed is not None:
+        registry.observe('tower_outbound_request_duration_seconds', labels, elapsed,
+                         metrics_settings()['LATENCY_BUCKETS'])
+    if sent:
+        registry.inc('tower_outbound_sent_bytes_total', labels, sent)
+    if received:
+        registry.inc('tower_outbound_received_bytes_total', labels, received)
+    if retries:
+        registry.inc('tower_outbound_retries_total', labels, retries)
+
+
+def histogram_quantile(q, buckets, values):
+    """Estimates the q-quantile of a histogram series like Prometheus's histogram_quantile()."""
+    count = values[-1]
+    if not count:
+        return None
+    rank, cumulative, lower = q * count, 0, 0.0
+    for bound, in_bucket in zip(buckets, values):
+        if in_bucket and cumulative + in_bucket >= rank:
+            return lower + (bound - lower) * (rank - cumulative) / in_bucket
+        cumulative += in_bucket
+        lower = bound
+    return buckets[-1]  # in the +Inf bucket: the highest finite bound is all that is known
+
+
+def tower_call_stats(tower_instance=None):
+    """Per (tower_instance, method, path) summary of Tower calls across every worker, slowest in total first."""
+    (counters, gauges, histograms), _ = registry.collect()
+    rows = {}
+
+    def row(labels):
+        labels = dict(labels)
+        key = (labels['tower_instance'], labels['method'], labels['path'])
+        if key not in rows:
+            rows[key] = {
+                'tower_instance': key[0], 'method': key[1], 'path': key[2],
+                'calls': 0, 'outcomes': {}, 'errors': 0, 'timeouts': 0,
+                'total_seconds': 0.0, 'mean_ms': None, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None,
+                'sent_bytes': 0, 'received_bytes': 0, 'retries': 0,
+            }
+        return rows[key]
+
+    for (name, labels), value in counters.items():
+        if not name.startswith('tower_outbound_') or (tower_instance and dict(labels)['tower_instance'] != tower_instance):
+            continue
+        if name == 'tower_outbound_requests_total':
+            outcome = dict(labels)['outcome']
+            entry = row(label for label in labels if label[0] != 'outcome')
+            entry['calls'] += int(value)
+            entry['outcomes'][outcome] = int(value)
+            if outcome in TOWER_CALL_FAILURES or outcome in ('4xx', '5xx'):
+                entry['errors'] += int(value)
+            if outcome == 'timeout':
+                entry['timeouts'] += int(value)
+        else:
+            field = name[len('tower_outbound_'):-len('_total')]
+            row(labels)[field] = int(value)
+
+    for (name, labels), (buckets, values) in histograms.items():
+        if name != 'tower_outbound_request_duration_seconds' or (tower_instance and dict(labels)['tower_instance'] != tower_instance):
+            continue
+        entry = row(labels)
+        entry['total_seconds'] = round(values[-2], 3)
+        entry['mean_ms'] = round(values[-2] / values[-1] * 1000, 1) if values[-1] else None
+        for q, field in ((0.5, 'p50_ms'), (0.95, 'p95_ms'), (0.99, 'p99_ms')):
+            estimate = histogram_quantile(q, buckets, values)
+            entry[field] = round(estimate * 1000, 1) if estimate is not None else None
+
+    return sorted(rows.values(), key=lambda entry: (-entry['total_seconds'], entry['tower_instance'], entry['path']))
+
+
+# -----------------------
+# Request timing
+# -----------------------
+_GROUP = re.compile(r'\(\?P<(\w+)>[^)]*\)|<(?:\w+:)?(\w+)>')
+
+
+def route_label(request):
+    """The URL pattern request.path_info matches, e.g. '/api/instances/{pk}/'; 'unmatched' for 404s."""
+    try:
+        match = get_resolver(getattr(request, 'urlconf', None)).resolve(request.path_info)
+    except Resolver404:
+        return 'unmatched'
+    if not match.route:
+        return 'unmatched'
+    route = _GROUP.sub(lambda m: '{%s}' % (m.group(1) or m.group(2)), match.route)
+    return '/' + route.replace('^', '').replace('$', '').replace('\\.', '.').replace('/?', '/')
+
+
+class MetricsMiddleware:
+    """Records latency, response size, status and in-flight count of every request.
+
+    Put it first in MIDDLEWARE so the measurement covers the other middleware.
+    Streaming responses are measured until their last chunk has been sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._enabled(request):
+            return self.get_response(request)
+        labels, started = self._start(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self._finish(labels, started, 500, 0)
+            raise
+        return self._track(labels, response, started)
+
+    async def __acall__(self, request):
+        if not self._enabled(request):
+            return await self.get_response(request)
+        labels, started = self._start(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            self._finish(labels, started, 500, 0)
+            raise
+        return self._track(labels, response, started)
+
+    @staticmethod
+    def _enabled(request):
+        conf = metrics_settings()
+        return conf['ENABLED'] and request.path not in conf['EXCLUDE']
+
+    @staticmethod
+    def _start(request):
+        # Resolved here (the resolver caches matches) so the in-flight gauge has its route too
+        labels = (('method', request.method), ('route', route_label(request)))
+        registry.add_gauge('tower_http_requests_in_flight', labels, 1)
+        return labels, time.perf_counter()
+
+    def _track(self, labels, response, started):
+        if not response.streaming:
+            self._finish(labels, started, response.status_code, len(response.content))
+            return response
+
+        finish = lambda size: self._finish(labels, started, response.status_code, size)
+        if response.is_async:
+            response.streaming_content = _count_async(response.streaming_content, finish)
+        else:
+            response.streaming_content = _count(response.streaming_content, finish)
+        return response
+
+    @staticmethod
+    def _finish(labels, started, status, size):
+        conf = metrics_settings()
+        elapsed = time.perf_counter() - started
+        registry.add_gauge('tower_http_requests_in_flight', labels, -1)
+        registry.inc('tower_http_requests_total', labels + (('status', str(status)),))
+        registry.observe('tower_http_request_duration_seconds', labels, elapsed, conf['LATENCY_BUCKETS'])
+        registry.observe('tower_http_response_size_bytes', labels, size, conf['SIZE_BUCKETS'])
+
+
+def _count(chunks, finish):
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        finish(size)
+
+
+async def _count_async(chunks, finish):
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        finish(size)
@@ -0,0 +1,80 @@
+# Generated by Django 5.2 on 2026-10-17 14:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tower', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TowerCredentialMirror',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remote_id', models.IntegerField()),
+                ('name', models.CharField(max_length=512)),
+                ('modified', models.DateTimeField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data', models.JSONField()),
+                ('tower_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_set', to='tower.towerinstance')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['tower_instance', 'name'], name='tower_tower_tower_i_6aad22_idx')],
+                'unique_together': {('tower_instance', 'remote_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TowerCredentialTypeMirror',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remote_id', models.IntegerField()),
+                ('name', models.CharField(max_length=512)),
+                ('modified', models.DateTimeField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data', models.JSONField()),
+                ('tower_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_set', to='tower.towerinstance')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['tower_instance', 'name'], name='tower_tower_tower_i_25b4fe_idx')],
+                'unique_together': {('tower_instance', 'remote_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TowerExecutionEnvironmentMirror',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remote_id', models.IntegerField()),
+                ('name', models.CharField(max_length=512)),
+                ('modified', models.DateTimeField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data', models.JSONField()),
+                ('tower_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_set', to='tower.towerinstance')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['tower_instance', 'name'], name='tower_tower_tower_i_018049_idx')],
+                'unique_together': {('tower_instance', 'remote_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TowerSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(choices=[('credentials', 'Credentials'), ('credential_types', 'Credential Types'), ('execution_environments', 'Execution Environments')], max_length=50)),
+                ('last_modified', models.DateTimeField(blank=True, null=True)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('tower_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_states', to='tower.towerinstance')),
+            ],
+            options={
+                'unique_together': {('tower_instance', 'resource')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+# Indexes the columns tower.blacklist scans by range. The tables belong to
+# simplejwt's token_blacklist app, hence raw SQL instead of Meta.indexes.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tower', '0005_token_revocations'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS outstandingtoken_expires_idx '
+            'ON token_blacklist_outstandingtoken (expires_at)',
+            'DROP INDEX IF EXISTS outstandingtoken_expires_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS blacklistedtoken_at_idx '
+            'ON token_blacklist_blacklistedtoken (blacklisted_at)',
+            'DROP INDEX IF EXISTS blacklistedtoken_at_idx',
+        ),
+    ]
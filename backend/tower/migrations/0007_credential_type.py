@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-17 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tower', '0006_token_blacklist_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CredentialType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=512, unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('kind', models.CharField(choices=[('cloud', 'Cloud'), ('net', 'Network')], default='cloud', max_length=20)),
+                ('inputs', models.JSONField(blank=True, default=dict)),
+                ('injectors', models.JSONField(blank=True, default=dict)),
+            ],
+        ),
+    ]
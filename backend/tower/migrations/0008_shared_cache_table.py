@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.db import migrations
+
+
+# The 'shared' cache (login throttle buckets of every worker) is a DatabaseCache.
+# Without its table each worker silently falls back to its own buckets.
+def create_cache_tables(apps, schema_editor):
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+def drop_cache_tables(apps, schema_editor):
+    for cache in settings.CACHES.values():
+        if cache['BACKEND'] == 'django.core.cache.backends.db.DatabaseCache':
+            schema_editor.execute('DROP TABLE IF EXISTS %s' % schema_editor.quote_name(cache['LOCATION']))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tower', '0007_credential_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_tables, drop_cache_tables),
+    ]
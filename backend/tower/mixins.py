@@ -0,0 +1,257 @@
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .audit import audit_signals_suppressed, compute_changes
+from .utils import log_action, log_actions
+from .versioning import table_versions, bump_table_version
+
+
+def _csv_param(request, name):
+    value = request.query_params.get(name, '')
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+class SparseFieldsMixin:
+    """Honours ?fields= and ?expand= on reads of a DynamicFieldsModelSerializer viewset.
+
+    Unrequested columns are deferred with only(), and expanded foreign keys
+    are joined with select_related() instead of being looked up per row.
+    """
+
+    def requested_fields(self):
+        return _csv_param(self.request, 'fields')
+
+    def requested_expansions(self):
+        expandable = getattr(self.get_serializer_class().Meta, 'expandable_fields', {})
+        return [name for name in _csv_param(self.request, 'expand') if name in expandable]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+
+        fields = self.requested_fields()
+        expand = self.requested_expansions()
+        if fields:
+            # An expansion outside ?fields= is not rendered, and only() would defer its FK column
+            expand = [name for name in expand if name in fields]
+        if expand:
+            queryset = queryset.select_related(*expand)
+
+        if fields:
+            model_fields = {f.name for f in queryset.model._meta.concrete_fields}
+            columns = {name for name in fields if name in model_fields}
+            # Keep the primary key and whatever the paginator orders by
+            columns.add(queryset.model._meta.pk.name)
+            ordering = getattr(self.paginator, 'ordering', None) or ()
+            columns.update(field.lstrip('-') for field in ordering)
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method in SAFE_METHODS:
+            kwargs.setdefault('fields', self.requested_fields())
+            kwargs.setdefault('expand', self.requested_expansions())
+        return super().get_serializer(*args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """Strong ETags on list and detail reads, derived from table version counters.
+
+    The tag covers the version of the viewset's table (plus etag_models, whose
+    rows show up in responses too, e.g. via ?expand=), the full path with its
+    query string and the negotiated media type. A matching If-None-Match is
+    answered with 304 before the queryset is evaluated or anything serialized.
+    """
+    etag_models = ()
+
+    def get_etag(self, request):
+        models = (self.queryset.model,) + tuple(self.etag_models)
+        versions = table_versions(*models)
+        key = f"{versions}|{request.get_full_path()}|{request.accepted_media_type}"
+        return '"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+    def _conditional(self, request, handler, *args, **kwargs):
+        # Read before the data so a concurrent write can only make the tag stale, never wrong
+        etag = self.get_etag(request)
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        # Let browsers keep the body but revalidate it on every poll
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(request, super().retrieve, *args, **kwargs)
+
+
+class AuditedModelMixin:
+    """Writes one audit entry per create/update/delete made through a ModelViewSet.
+
+    Updates are diffed from the instance DRF already loaded for the request,
+    so auditing costs no extra query.
+    """
+
+    def audit(self, action, obj, changes=None):
+        log_action(user=self.request.user.username, action=action, obj=obj, changes=changes)
+
+    def perform_create(self, serializer):
+        with audit_signals_suppressed():
+            instance = serializer.save()
+        self.audit('created', instance)
+
+    def perform_update(self, serializer):
+        changes = compute_changes(serializer)
+        with audit_signals_suppressed():
+            instance = serializer.save()
+        self.audit('updated', instance, changes)
+
+    def perform_destroy(self, instance):
+        self.audit('deleted', instance)
+        with audit_signals_suppressed():
+            instance.delete()
+
+
+class BulkMixin:
+    """Adds <resource>/bulk/ to an audited ModelViewSet.
+
+    POST takes a list of objects to create, PATCH a list of partial updates
+    (each with its "id"), DELETE {"ids": [...]}. The whole batch is validated
+    first; if any item fails, nothing is written and the response carries one
+    error dict per item, in input order. Otherwise the batch is written in
+    one transaction with bulk_create/bulk_update and audited in one batch.
+    """
+
+    def _bulk_items(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'detail': 'Expected a non-empty list.'})
+        limit = getattr(settings, 'BULK_MAX_ITEMS', 5000)
+        if len(items) > limit:
+            raise ValidationError({'detail': f'At most {limit} items per request.'})
+        return items
+
+    def _bulk_context(self, items):
+        """Serializer context with every referenced foreign key preloaded in one query per relation."""
+        context = self.get_serializer_context()
+        related = {}
+        for name, field in self.get_serializer().fields.items():
+            if not isinstance(field, serializers.PrimaryKeyRelatedField) or field.read_only:
+                continue
+            ids = {item.get(name) for item in items if isinstance(item, dict) and item.get(name) is not None}
+            try:
+                ids = {int(pk) for pk in ids}
+            except (TypeError, ValueError):
+                continue
+            queryset = field.get_queryset()
+            related[queryset.model] = queryset.in_bulk(ids)
+        context['related_objects'] = related
+        return context
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        if request.method == 'POST':
+            return self.bulk_create(request)
+        if request.method == 'PATCH':
+            return self.bulk_update(request)
+        return self.bulk_destroy(request)
+
+    def bulk_create(self, request):
+        items = self._bulk_items(request)
+        context = self._bulk_context(items)
+        batch = [self.get_serializer(data=item, context=context) for item in items]
+        errors = [{} if serializer.is_valid() else serializer.errors for serializer in batch]
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.get_queryset().model
+        with transaction.atomic():
+            objs = model.objects.bulk_create(
+                [model(**serializer.validated_data) for serializer in batch],
+                batch_size=getattr(settings, 'BULK_BATCH_SIZE', 500),
+            )
+            bump_table_version(model)
+            transaction.on_commit(lambda: log_actions(request.user.username, 'created', objs))
+        return Response(self.get_serializer(objs, many=True).data, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, request):
+        items = self._bulk_items(request)
+        ids = []
+        for item in items:
+            try:
+                ids.append(int(item.get('id')))
+            except (AttributeError, TypeError, ValueError):
+                ids.append(None)
+        instances = self.get_queryset().in_bulk([pk for pk in ids if pk is not None])
+
+        context = self._bulk_context(items)
+        batch, errors = [], []
+        for pk, item in zip(ids, items):
+            instance = instances.get(pk)
+            if instance is None:
+                batch.append(None)
+                errors.append({'id': ['Not found.']})
+                continue
+            serializer = self.get_serializer(instance, data=item, partial=True, context=context)
+            batch.append(serializer)
+            errors.append({} if serializer.is_valid() else serializer.errors)
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        objs, changes, fields = [], [], set()
+        for serializer in batch:
+            changes.append(compute_changes(serializer))
+            for name, value in serializer.validated_data.items():
+                setattr(serializer.instance, name, value)
+                fields.add(name)
+            objs.append(serializer.instance)
+
+        model = self.get_queryset().model
+        with transaction.atomic():
+            if fields:
+                model.objects.bulk_update(objs, list(fields), batch_size=getattr(settings, 'BULK_BATCH_SIZE', 500))
+                bump_table_version(model)
+            transaction.on_commit(lambda: log_actions(request.user.username, 'updated', objs, changes))
+        return Response(self.get_serializer(objs, many=True).data)
+
+    def bulk_destroy(self, request):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids:
+            raise ValidationError({'ids': 'Expected a non-empty list of ids.'})
+        try:
+            ids = {int(pk) for pk in ids}
+        except (TypeError, ValueError):
+            raise ValidationError({'ids': 'Every id must be an integer.'})
+
+        objs = list(self.get_queryset().filter(pk__in=ids))
+        with transaction.atomic():
+            self.perform_bulk_destroy(objs)
+            transaction.on_commit(lambda: log_actions(request.user.username, 'deleted', objs))
+        return Response({
+            'deleted': len(objs),
+            'not_found': sorted(ids - {obj.pk for obj in objs}),
+        })
+
+    def perform_bulk_destroy(self, objs):
+        model = self.get_queryset().model
+        with audit_signals_suppressed():
+            model.objects.filter(pk__in=[obj.pk for obj in objs]).delete()
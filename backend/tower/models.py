@@ -28,6 +28,13 @@ class AuditLog(models.Model):
     timestamp = models.DateTimeField(default=now)
     changes = models.JSONField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp'], name='auditlog_timestamp_idx'),
+            models.Index(fields=['object_type', 'object_id', 'timestamp'], name='auditlog_object_idx'),
+            models.Index(fields=['user', 'timestamp'], name='auditlog_user_idx'),
+        ]
+
     def __str__(self):
         return f"{self.timestamp} {self.user} {self.action} {self.object_type} ({self.object_id})"
 
@@ -74,6 +81,105 @@ class ExecutionEnvironment(models.Model):
         return self.name
 
 
+class CredentialType(models.Model):
+    """Canonical credential type definition that every Tower instance should carry."""
+    KIND_CHOICES = [
+        ('cloud', 'Cloud'),
+        ('net', 'Network'),
+    ]
+
+    name = models.CharField(max_length=512, unique=True)
+    description = models.TextField(blank=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='cloud')
+    inputs = models.JSONField(default=dict, blank=True)
+    injectors = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class TowerSyncState(models.Model):
+    """Incremental sync watermark of one resource mirrored from one Tower instance."""
+    RESOURCE_CHOICES = [
+        ('credentials', 'Credentials'),
+        ('credential_types', 'Credential Types'),
+        ('execution_environments', 'Execution Environments'),
+    ]
+
+    tower_instance = models.ForeignKey(
+        TowerInstance,
+        on_delete=models.CASCADE,
+        related_name="sync_states"
+    )
+    resource = models.CharField(max_length=50, choices=RESOURCE_CHOICES)
+    last_modified = models.DateTimeField(blank=True, null=True)  # highest remote 'modified' mirrored so far
+    last_synced_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ('tower_instance', 'resource')
+
+    def __str__(self):
+        return f"{self.tower_instance.name} {self.resource} @ {self.last_synced_at}"
+
+
+class MirroredTowerObject(models.Model):
+    """A row copied from a Tower API list endpoint by the sync engine (tower/sync.py)."""
+    tower_instance = models.ForeignKey(
+        TowerInstance,
+        on_delete=models.CASCADE,
+        related_name="%(class)s_set"
+    )
+    remote_id = models.IntegerField()
+    name = models.CharField(max_length=512)
+    modified = models.DateTimeField(blank=True, null=True)  # 'modified' as reported by Tower
+    synced_at = models.DateTimeField(default=now)
+    data = models.JSONField()
+
+    class Meta:
+        abstract = True
+        unique_together = ('tower_instance', 'remote_id')
+        indexes = [
+            models.Index(fields=['tower_instance', 'name']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.tower_instance_id}:{self.remote_id})"
+
+
+class TowerCredentialMirror(MirroredTowerObject):
+    class Meta(MirroredTowerObject.Meta):
+        pass
+
+
+class TowerCredentialTypeMirror(MirroredTowerObject):
+    class Meta(MirroredTowerObject.Meta):
+        pass
+
+
+class TowerExecutionEnvironmentMirror(MirroredTowerObject):
+    class Meta(MirroredTowerObject.Meta):
+        pass
+
+
+class TokenRevocation(models.Model):
+    """JWTs of user_id that were issued (auth_time claim) before revoked_at are refused."""
+    user_id = models.IntegerField(primary_key=True)  # not a FK: revocations must outlive deleted users
+    revoked_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"user {self.user_id} revoked at {self.revoked_at}"
+
+
+class TableVersion(models.Model):
+    """Change counter of one table, bumped on every committed write (see tower/versioning.py)."""
+    table = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
+
+
 class CustomUser(AbstractUser):
     ROLE_CHOICES = [
         ('admin', 'Admin'),
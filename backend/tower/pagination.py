@@ -0,0 +1,89 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+def approximate_count(queryset, ttl=None):
+    """Row count for a list endpoint, cheap enough to serve on every request.
+
+    Unfiltered PostgreSQL tables use the planner estimate (pg_class.reltuples);
+    anything else runs COUNT(*) once per PAGINATION_COUNT_TTL seconds per query.
+    """
+    ttl = ttl if ttl is not None else getattr(settings, 'PAGINATION_COUNT_TTL', 60)
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+
+    sql, params = queryset.query.sql_with_params()
+    key = 'approx-count:' + hashlib.md5(repr((queryset.db, sql, params)).encode()).hexdigest()
+    return cache.get_or_set(key, queryset.count, ttl)
+
+
+class BoundedCursorPagination(CursorPagination):
+    """Project-wide keyset pagination with a capped page size.
+
+    ?page_size= (or ?limit=) picks the page size up to MAX_PAGE_SIZE; ?count=1
+    adds an approximate total to the response.
+    """
+    ordering = ('id',)
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, 'MAX_PAGE_SIZE', 1000)
+
+    def get_page_size(self, request):
+        for param in (self.page_size_query_param, 'limit'):
+            try:
+                size = int(request.query_params[param])
+            except (KeyError, ValueError):
+                continue
+            if size > 0:
+                return min(size, self.max_page_size)
+        return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get('count') in ('1', 'true'):
+            self.count = approximate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            payload['count'] = self.count
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'example': 123}
+        return response_schema
+
+
+class AuditLogCursorPagination(BoundedCursorPagination):
+    """Keyset pagination over AuditLog, newest first.
+
+    Each page is a single index range scan on timestamp, so page 10,000 costs
+    the same as page 1.
+    """
+    ordering = ('-timestamp', '-id')
+    page_size = 50
+
+    @property
+    def max_page_size(self):
+        return min(getattr(settings, 'MAX_PAGE_SIZE', 1000), 500)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import TowerInstance, Credential, ExecutionEnvironment, AuditLog
+from .models import TowerInstance, Credential, CredentialType, ExecutionEnvironment, AuditLog
 
 
 User = get_user_model()
@@ -19,7 +19,48 @@ class AuditLogSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class TowerInstanceSerializer(serializers.ModelSerializer):
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField that first looks in context['related_objects'][Model][pk].
+
+    Bulk endpoints preload every referenced row with one in_bulk() query, so
+    validating thousands of items does not cost one lookup per item.
+    """
+
+    def to_internal_value(self, data):
+        preloaded = self.context.get('related_objects', {}).get(self.get_queryset().model)
+        if preloaded is not None:
+            try:
+                return preloaded[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer that accepts `fields` and `expand` arguments.
+
+    The viewsets fill them from ?fields=a,b and ?expand=tower_instance: fields
+    not requested are dropped, and expanded foreign keys are rendered with the
+    serializer listed in Meta.expandable_fields instead of as a primary key.
+    """
+    serializer_related_field = CachedPrimaryKeyRelatedField
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in expand or ():
+            if name in expandable:
+                self.fields[name] = expandable[name](read_only=True)
+
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class TowerInstanceSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = TowerInstance
         exclude = []
@@ -28,16 +69,24 @@ class TowerInstanceSerializer(serializers.ModelSerializer):
         }
 
 
-class CredentialSerializer(serializers.ModelSerializer):
+class CredentialTypeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CredentialType
+        fields = '__all__'
+
+
+class CredentialSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Credential
         fields = '__all__'
         extra_kwargs = {
             'password': {'write_only': True}
         }
+        expandable_fields = {'tower_instance': TowerInstanceSerializer}
 
 
-class ExecutionEnvironmentSerializer(serializers.ModelSerializer):
+class ExecutionEnvironmentSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = ExecutionEnvironment
         fields = '__all__'
+        expandable_fields = {'tower_instance': TowerInstanceSerializer}
@@ -0,0 +1,135 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from .models import (
+    TowerSyncState,
+    TowerCredentialMirror,
+    TowerCredentialTypeMirror,
+    TowerExecutionEnvironmentMirror,
+)
+from .tower_client import get_client
+
+
+# resource name -> (Tower API list endpoint, local mirror model)
+RESOURCES = {
+    'credentials': ('/api/v2/credentials/', TowerCredentialMirror),
+    'credential_types': ('/api/v2/credential_types/', TowerCredentialTypeMirror),
+    'execution_environments': ('/api/v2/execution_environments/', TowerExecutionEnvironmentMirror),
+}
+
+DEFAULTS = {
+    'MAX_STALENESS': 600,  # seconds after which mirrored rows are no longer served to readers
+}
+
+
+def mirror_settings():
+    """Returns the TOWER_MIRROR settings merged over the defaults."""
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, 'TOWER_MIRROR', {}))
+    return conf
+
+
+def sync_resource(instance, resource, full=False):
+    """Mirrors one resource of one TowerInstance into its local table.
+
+    Incremental runs only ask Tower for rows with modified__gte the stored
+    watermark: a row modified in the same instant as the watermark, but after
+    the page that set it was fetched, must not be skipped. The rows at the
+    watermark are read again each run; the upsert makes that harmless. A full run re-reads everything and also removes rows that no
+    longer exist remotely (incremental runs cannot see deletions).
+    Returns the number of rows upserted.
+    """
+    path, model = RESOURCES[resource]
+    state, _ = TowerSyncState.objects.get_or_create(tower_instance=instance, resource=resource)
+
+    params = {'order_by': 'modified'}
+    if state.last_modified and not full:
+        params['modified__gte'] = state.last_modified.isoformat()
+
+    started_at = now()
+    watermark = None if full else state.last_modified
+    upserted = 0
+
+    try:
+        for page in get_client(instance).iter_pages(path, params, use_cache=False):
+            rows = []
+            for item in page:
+                modified = parse_datetime(item['modified']) if item.get('modified') else None
+                if modified and (watermark is None or modified > watermark):
+                    watermark = modified
+                rows.append(model(
+                    tower_instance=instance,
+                    remote_id=item['id'],
+                    name=item.get('name', ''),
+                    modified=modified,
+                    synced_at=started_at,
+                    data=item,
+                ))
+            if rows:
+                model.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=['tower_instance', 'remote_id'],
+                    update_fields=['name', 'modified', 'synced_at', 'data'],
+                )
+                upserted += len(rows)
+    except Exception as e:
+        state.last_error = str(e)
+        state.save(update_fields=['last_error'])
+        raise
+
+    if full:
+        # Every row still on Tower was just stamped with started_at
+        model.objects.filter(tower_instance=instance, synced_at__lt=started_at).delete()
+
+    state.last_modified = watermark
+    state.last_synced_at = started_at
+    state.last_error = ''
+    state.save(update_fields=['last_modified', 'last_synced_at', 'last_error'])
+    return upserted
+
+
+def mirror_object(instance, resource, item):
+    """Write-through for objects this app just created on Tower, so readers see them before the next sync."""
+    _, model = RESOURCES[resource]
+    model.objects.update_or_create(
+        tower_instance=instance,
+        remote_id=item['id'],
+        defaults={
+            'name': item.get('name', ''),
+            'modified': parse_datetime(item['modified']) if item.get('modified') else None,
+            'synced_at': now(),
+            'data': item,
+        },
+    )
+
+
+def sync_instance(instance, resources=None, full=False):
+    """Syncs every (or the given) resource of one instance.
+
+    Returns {resource: rows upserted or the exception raised}; one failing
+    resource (e.g. no execution environments on Tower 3.x) does not stop the others.
+    """
+    results = {}
+    for resource in resources or RESOURCES:
+        try:
+            results[resource] = sync_resource(instance, resource, full=full)
+        except Exception as e:
+            results[resource] = e
+    return results
+
+
+def fresh_instance_ids(resource, instances):
+    """Returns the pks of instances whose mirror of resource is recent enough to serve reads from."""
+    cutoff = now() - timedelta(seconds=mirror_settings()['MAX_STALENESS'])
+    return set(
+        TowerSyncState.objects.filter(
+            tower_instance__in=instances,
+            resource=resource,
+            last_synced_at__gte=cutoff,
+            last_error='',
+        ).values_list('tower_instance_id', flat=True)
+    )
@@ -0,0 +1,517 @@
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+from rest_framework.throttling import UserRateThrottle
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from . import circuit_breaker, tower_client
+from .authentication import RoleClaimsRefreshToken, revocations
+from .blacklist import blacklist_filter
+from .circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from .fake_aap import FakeAAP, FakeAAPServer
+from .metrics import record_tower_call, registry, render
+from .models import AuditLog, Credential, CredentialType, TowerConfig, TowerCredentialMirror, TowerInstance
+from .sync import sync_resource
+from .throttling import LoginRateThrottle
+from .tower_cache import inventory_cache, invalidate_tower_cache
+from .tower_client import AsyncTowerClient, drop_client, get_client
+
+User = get_user_model()
+
+# Keeps the test run's request metrics out of the METRICS['DIRECTORY'] that /metrics reads
+_metrics_settings = override_settings(METRICS={'DIRECTORY': None})
+
+
+def setUpModule():
+    _metrics_settings.enable()
+
+
+def tearDownModule():
+    _metrics_settings.disable()
+
+
+def streamed(response):
+    """Body of a streaming response, consumed as a WSGI server would."""
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='StreamingHttpResponse must consume')
+        return b''.join(response)
+
+
+@override_settings(AUDIT_LOG={'ASYNC': False})
+class APITestCase(TestCase):
+    role = 'admin'
+
+    def setUp(self):
+        self.user = User.objects.create_user('tester', password='password', role=self.role)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+# -----------------------
+# Audit log export
+# -----------------------
+class AuditLogExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        AuditLog.objects.bulk_create(
+            AuditLog(user='tester', action='created', object_type='Credential', object_id=n,
+                     object_repr=f'credential-{n}', changes={'n': n})
+            for n in range(5)
+        )
+
+    def test_ndjson(self):
+        response = self.client.get('/api/audit-logs/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['object_id'] for row in rows], list(range(5)))
+
+    def test_csv_gzip(self):
+        response = self.client.get('/api/audit-logs/export/?output=csv&gzip=1')
+        self.assertEqual(response.status_code, 200)
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(lines[0].split(','), ['id', 'timestamp', 'user', 'action', 'object_type',
+                                              'object_id', 'object_repr', 'changes'])
+        self.assertEqual(len(lines), 6)
+
+    def test_admins_only(self):
+        self.user.role = 'viewer'
+        self.user.save()
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/audit-logs/export/').status_code, 403)
+
+
+# -----------------------
+# Sparse fields and expansion
+# -----------------------
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        instance = TowerInstance.objects.create(name='tower-1', url='https://tower-1.example.com',
+                                                username='admin', password='password')
+        Credential.objects.create(name='credential-1', type='machine', username='user', password='secret',
+                                  tower_instance=instance)
+
+    def test_fields_without_the_expanded_relation(self):
+        response = self.client.get('/api/credentials/?fields=name&expand=tower_instance')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{'name': 'credential-1'}])
+
+    def test_fields_with_the_expanded_relation(self):
+        response = self.client.get('/api/credentials/?fields=name,tower_instance&expand=tower_instance')
+        self.assertEqual(response.status_code, 200)
+        [row] = response.json()['results']
+        self.assertEqual(row['name'], 'credential-1')
+        self.assertEqual(row['tower_instance']['name'], 'tower-1')
+        self.assertNotIn('password', row['tower_instance'])
+
+
+# -----------------------
+# Credential types across Tower instances
+# -----------------------
+class TowerTestCase(APITestCase):
+    """Runs a fake AAP for the duration of each test."""
+
+    def setUp(self):
+        super().setUp()
+        self.aap = FakeAAPServer(('127.0.0.1', 0), FakeAAP(credential_types=3)).start()
+        self.addCleanup(self.aap.stop)
+        self.addCleanup(inventory_cache.clear)
+
+    def add_instance(self, name, password='password'):
+        instance = TowerInstance.objects.create(name=name, url=self.aap.url, username='admin', password=password)
+        self.addCleanup(drop_client, instance)
+        return instance
+
+
+class CredentialTypeStatusTests(TowerTestCase):
+    def test_status_matrix(self):
+        self.add_instance('tower-a')
+        self.add_instance('tower-b')
+        self.add_instance('tower-c', password='wrong')
+        CredentialType.objects.create(name='Credential Type 1')
+        CredentialType.objects.create(name='Credential Type 9')
+
+        response = self.client.get('/api/credential-type-status/')
+        self.assertEqual(response.status_code, 200)
+        present, missing = response.json()
+        self.assertEqual(present['present_in_instances'], ['tower-a', 'tower-b'])
+        self.assertEqual(present['status'], 'Orange')
+        self.assertTrue(present['missing_in_instances'][0].startswith('tower-c (Error:'))
+        self.assertEqual(missing['present_in_instances'], [])
+        self.assertEqual(missing['status'], 'Red')
+
+    def test_each_inventory_fetched_once(self):
+        self.add_instance('tower-a')
+        for n in range(1, 4):
+            CredentialType.objects.create(name=f'Credential Type {n}')
+
+        response = self.client.get('/api/credential-type-status/')
+        self.assertEqual([row['status'] for row in response.json()], ['Green'] * 3)
+        self.assertEqual(self.aap.aap.stats(), {'GET /api/v2/credential_types/ 200': 1})
+
+
+class DuplicateCredentialTypeTests(TowerTestCase):
+    def test_duplicates_where_missing(self):
+        self.add_instance('tower-a')
+        self.add_instance('tower-b', password='wrong')
+        credential_type = CredentialType.objects.create(name='Custom Type', kind='cloud')
+
+        response = self.client.post('/api/duplicate-credential-type/', {
+            'id': credential_type.pk, 'missing_in_instances': ['tower-a', 'tower-b', 'tower-x'],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = {row['instance']: row['status'] for row in json.loads(streamed(response))}
+        self.assertEqual(results, {'tower-a': 'duplicated', 'tower-b': 'error', 'tower-x': 'instance_not_found'})
+        self.assertEqual(self.aap.aap.stats()['POST /api/v2/credential_types/ 201'], 1)
+
+        # The write invalidated the cached inventory, so a repeat sees the new type
+        response = self.client.post('/api/duplicate-credential-type/?output=ndjson', {
+            'id': credential_type.pk, 'missing_in_instances': ['tower-a'],
+        }, format='json')
+        rows = [json.loads(line) for line in streamed(response).splitlines()]
+        self.assertEqual(rows, [{'instance': 'tower-a', 'status': 'already_exists'}])
+
+    def test_unknown_credential_type(self):
+        response = self.client.post('/api/duplicate-credential-type/', {
+            'id': 999, 'missing_in_instances': ['tower-a'],
+        }, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class VerifyCredentialTypeTests(TowerTestCase):
+    def test_lookup_by_alternative_name(self):
+        self.add_instance('tower-a')
+        credential_type = CredentialType.objects.create(name='Custom Type')
+
+        response = self.client.post('/api/verify-credential-type/', {
+            'id': credential_type.pk, 'alternative_name': 'Credential Type 2',
+            'missing_in_instances': ['tower-a', 'tower-x'],
+        }, format='json')
+        self.assertEqual(response.json(), [
+            {'instance': 'tower-a', 'status': 'found', 'found_name': 'Credential Type 2'},
+            {'instance': 'tower-x', 'status': 'instance_not_found'},
+        ])
+
+
+# -----------------------
+# Tower response cache
+# -----------------------
+class TowerCacheTests(TowerTestCase):
+    def test_next_links_share_keys_with_relative_paths(self):
+        key = inventory_cache.make_key(('TowerInstance', 1), 'https://tower/api/v2/credentials/?page=2&page_size=25')
+        self.assertEqual(key, inventory_cache.make_key(
+            ('TowerInstance', 1), '/api/v2/credentials/', {'page_size': 25, 'page': 2}
+        ))
+
+    def test_invalidation_covers_every_page(self):
+        instance = self.add_instance('tower-a')
+        client = get_client(instance)
+        pages = list(client.iter_pages('/api/v2/credential_types/', {'page_size': 2}))
+        self.assertEqual(len(pages), 2)
+
+        invalidate_tower_cache(instance, '/api/v2/credential_types/')
+        self.assertEqual(len(inventory_cache), 0)
+        list(client.iter_pages('/api/v2/credential_types/', {'page_size': 2}))
+        self.assertEqual(self.aap.aap.stats()['GET /api/v2/credential_types/ 200'], 4)
+
+
+# -----------------------
+# Circuit breaker
+# -----------------------
+@override_settings(TOWER_CIRCUIT_BREAKER={'MIN_CALLS': 2, 'OPEN_SECONDS': 0, 'PROBE_TIMEOUT': 60})
+class CircuitBreakerTests(TestCase):
+    def half_open_breaker(self):
+        breaker = CircuitBreaker(('test', 1))
+        for _ in range(2):
+            self.assertTrue(breaker.allow())
+            breaker.record(False)
+        self.assertEqual(breaker.state, OPEN)
+        return breaker
+
+    def test_probe_without_verdict_frees_its_slot(self):
+        breaker = self.half_open_breaker()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record(None)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_unreported_probe_expires(self):
+        breaker = self.half_open_breaker()
+        self.assertTrue(breaker.allow())
+        with override_settings(TOWER_CIRCUIT_BREAKER={'PROBE_TIMEOUT': 0}):
+            self.assertTrue(breaker.allow())
+
+    def test_cancelled_async_probe_reports_back(self):
+        aap = FakeAAPServer(('127.0.0.1', 0), FakeAAP(latency=1)).start()
+        self.addCleanup(aap.stop)
+        client = AsyncTowerClient(aap.url, 'admin', 'password', key=('test', 2))
+        breaker = self.half_open_breaker()
+        client.breaker = breaker
+
+        async def cancel_probe():
+            probe = asyncio.ensure_future(client.get('/api/v2/ping/'))
+            await asyncio.sleep(0.2)
+            probe.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await probe
+            await client.close()
+
+        asyncio.run(cancel_probe())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+
+# -----------------------
+# Connection test
+# -----------------------
+class TestConnectionTests(TowerTestCase):
+    def test_ad_hoc_urls_are_not_pooled(self):
+        def pooled():
+            return len(tower_client._clients), len(tower_client._async_clients), len(circuit_breaker._breakers)
+
+        before = pooled()
+        port = self.aap.server_address[1]
+        for url in (self.aap.url, f'http://localhost:{port}', f'http://localhost:{port}/'):
+            response = self.client.post('/api/test-connection/', {
+                'url': url, 'username': 'admin', 'password': 'password',
+            }, format='json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(pooled(), before)
+
+    def test_unreachable(self):
+        response = self.client.post('/api/test-connection/', {
+            'url': 'http://127.0.0.1:9', 'username': 'admin', 'password': 'password',
+        }, format='json')
+        self.assertEqual(response.status_code, 503)
+
+
+class AsyncThrottleTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_default_throttles_apply_to_async_views(self):
+        with patch.object(api_settings, 'DEFAULT_THROTTLE_CLASSES', [UserRateThrottle]), \
+                patch.object(UserRateThrottle, 'THROTTLE_RATES', {'user': '2/min'}):
+            responses = [self.client.get('/api/tower-credentials/') for _ in range(3)]
+        self.assertEqual([response.status_code for response in responses], [503, 503, 429])
+        self.assertIn('Retry-After', responses[-1].headers)
+
+
+class RedirectTests(TowerTestCase):
+    """A Tower that moved its API, like AAP 2.5's gateway, answers /api/v2/ with a redirect."""
+
+    def setUp(self):
+        super().setUp()
+        self.moved = FakeAAPServer(('127.0.0.1', 0), FakeAAP(credentials=30, api_prefix='/api/controller/v2/')).start()
+        self.addCleanup(self.moved.stop)
+
+    def test_connection_follows_redirects(self):
+        response = self.client.post('/api/test-connection/', {
+            'url': self.moved.url, 'username': 'admin', 'password': 'password',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.moved.aap.stats().get('GET /api/controller/v2/ping/ 200'), 1)
+
+    def test_credentials_follow_redirects(self):
+        config = TowerConfig.objects.create(base_url=self.moved.url, username='admin', password='password')
+        self.addCleanup(drop_client, config)
+        response = self.client.get('/api/tower-credentials/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(streamed(response))), 30)
+
+
+# -----------------------
+# Inventory mirror
+# -----------------------
+class MirrorSyncTests(TowerTestCase):
+    def test_rows_modified_at_the_watermark_are_not_skipped(self):
+        instance = self.add_instance('tower-1')
+        sync_resource(instance, 'credentials')
+        latest = max(self.aap.aap._rows['credentials'], key=lambda row: row['modified'])
+        # Committed on Tower in the same instant, after the first sync read its page
+        self.aap.aap._rows['credentials'].append(dict(latest, id=999, name='late credential'))
+
+        sync_resource(instance, 'credentials')
+        self.assertTrue(TowerCredentialMirror.objects.filter(tower_instance=instance, remote_id=999).exists())
+
+
+# -----------------------
+# Bulk writes and the audit cursor
+# -----------------------
+class BulkAuditTests(APITestCase):
+    def test_bulk_entries_page_by_timestamp(self):
+        instance = TowerInstance.objects.create(name='tower-1', url='https://tower-1.example.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/credentials/bulk/', [
+                {'name': f'credential-{n}', 'type': 'machine', 'username': 'u', 'password': 'p',
+                 'tower_instance': instance.pk}
+                for n in range(250)
+            ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(AuditLog.objects.values('timestamp').distinct().count(), 251)
+
+        ids, url = [], '/api/audit-logs/?page_size=100'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                page = self.client.get(url).json()
+                ids.extend(row['id'] for row in page['results'])
+                url = page['next']
+        self.assertEqual(sorted(ids), sorted(AuditLog.objects.values_list('id', flat=True)))
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+
+
+# -----------------------
+# Login throttling
+# -----------------------
+@override_settings(LOGIN_THROTTLE={'IP_BURST': 2, 'USERNAME_BURST': 100}, CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'login-throttle-tests'},
+})
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        LoginRateThrottle._local_buckets.clear()
+        self.addCleanup(LoginRateThrottle._local_buckets.clear)
+
+    def login(self, forwarded_for):
+        return APIClient().post('/api/login/', {'username': f'user-{forwarded_for}', 'password': 'x'},
+                                format='json', HTTP_X_FORWARDED_FOR=forwarded_for)
+
+    def test_forged_forwarded_for_is_ignored(self):
+        statuses = [self.login(f'10.0.0.{n}').status_code for n in range(3)]
+        self.assertEqual(statuses, [401, 401, 429])
+
+    def test_forwarded_for_behind_a_proxy(self):
+        with patch.object(api_settings, 'NUM_PROXIES', 1):
+            statuses = [self.login(f'10.0.0.{n}').status_code for n in range(3)]
+        self.assertEqual(statuses, [401, 401, 401])
+
+
+# -----------------------
+# Refresh token blacklist
+# -----------------------
+class RefreshBlacklistTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('tester', password='password', role='admin')
+        blacklist_filter.clear()
+        self.addCleanup(blacklist_filter.clear)
+
+    def blacklist_elsewhere(self):
+        refresh = RoleClaimsRefreshToken.for_user(self.user)
+        self.assertFalse(blacklist_filter.might_contain('unknown-jti'))
+        # Another worker's rotation: in the database, not in this process's filter yet
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=refresh['jti']))
+        return APIClient().post('/api/refresh/', {'refresh': str(refresh)}, format='json')
+
+    @override_settings(TOKEN_BLACKLIST={'FILTER_REFRESH': 60})
+    def test_other_workers_blacklist_is_trusted_until_the_next_catch_up(self):
+        self.assertEqual(self.blacklist_elsewhere().status_code, 200)
+
+    @override_settings(TOKEN_BLACKLIST={'FILTER_REFRESH': 0})
+    def test_other_workers_blacklist_is_seen_after_a_catch_up(self):
+        self.assertEqual(self.blacklist_elsewhere().status_code, 401)
+
+
+# -----------------------
+# Token revocation
+# -----------------------
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('tester', password='password', role='admin')
+        revocations.clear()
+        self.addCleanup(revocations.clear)
+
+    def user_info(self, token):
+        return APIClient().get('/api/user-info/', HTTP_AUTHORIZATION=f'Bearer {token}').status_code
+
+    def test_saves_outside_the_api_revoke_tokens(self):
+        for change in (lambda user: setattr(user, 'is_active', False),
+                       lambda user: setattr(user, 'role', 'viewer'),
+                       lambda user: user.set_password('changed')):
+            user = User.objects.get(pk=self.user.pk)
+            token = RoleClaimsRefreshToken.for_user(user).access_token
+            self.assertEqual(self.user_info(token), 200)
+            change(user)
+            user.save()
+            self.assertEqual(self.user_info(token), 401)
+            User.objects.filter(pk=user.pk).update(is_active=True)
+
+    def test_unrelated_saves_keep_tokens(self):
+        token = RoleClaimsRefreshToken.for_user(self.user).access_token
+        self.user.first_name = 'Test'
+        self.user.save()
+        update_last_login(None, self.user)
+        self.assertEqual(self.user_info(token), 200)
+
+
+# -----------------------
+# Metrics
+# -----------------------
+class MetricsTests(TestCase):
+    series = ('tower_outbound_retries_total', (('tower_instance', 'tower-1'),))
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def write_snapshot(self, name, value, age=0):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            json.dump({'counters': [[self.series[0], [list(pair) for pair in self.series[1]], value]],
+                       'gauges': [], 'histograms': []}, f)
+        os.utime(path, (time.time() - age, time.time() - age))
+
+    def collected(self):
+        (counters, _, _), _ = registry.collect()
+        return counters.get(self.series)
+
+    @override_settings(METRICS={'TOKEN': 'secret', 'DIRECTORY': None})
+    def test_configured_token_is_required_from_allowed_ips(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_exited_workers_stay_in_the_totals(self):
+        with self.settings(METRICS={'DIRECTORY': self.directory, 'RETENTION': 60}):
+            self.write_snapshot('host-1.json', 5, age=120)
+            self.write_snapshot('host-2.json', 1)
+            self.assertEqual(self.collected(), 6)
+            self.assertFalse(os.path.exists(os.path.join(self.directory, 'host-1.json')))
+            self.assertEqual(self.collected(), 6)
+
+            # A new process that got the same pid starts from zero
+            self.write_snapshot('host-1.json', 2)
+            self.assertEqual(self.collected(), 8)
+
+    @override_settings(METRICS={'DIRECTORY': None})
+    def test_tower_calls_are_labelled_by_tower_instance(self):
+        record_tower_call('tower-1', 'GET', '/api/v2/credentials/42/', '2xx', elapsed=0.1)
+        record_tower_call('tower-2', 'GET', '/api/v2/ping/', 'timeout', elapsed=5.0)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('tester', password='password', role='admin'))
+
+        rows = client.get('/api/instances/tower-calls/?tower_instance=tower-1').json()
+        self.assertEqual([(row['tower_instance'], row['path'], row['calls']) for row in rows],
+                         [('tower-1', '/api/v2/credentials/{id}/', 1)])
+        self.assertIn('tower_instance="tower-2"', render())
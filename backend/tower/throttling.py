@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CACHE': 'default',         # CACHES alias holding the buckets shared by all workers
+    'IP_BURST': 20,             # attempts a client IP may make back to back
+    'IP_PER_MINUTE': 10,        # attempts per minute it earns back
+    'USERNAME_BURST': 5,
+    'USERNAME_PER_MINUTE': 2,
+}
+
+LOCAL_MAX_BUCKETS = 10000
+
+
+def throttle_settings():
+    """Returns the LOGIN_THROTTLE settings merged over the defaults."""
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, 'LOGIN_THROTTLE', {}))
+    return conf
+
+
+def _refill(state, burst, per_minute, now):
+    """Returns the tokens in a bucket saved as (tokens, timestamp), topped up for the time elapsed."""
+    if state is None:
+        return float(burst)
+    tokens, stamp = state
+    return min(float(burst), tokens + (now - stamp) * per_minute / 60.0)
+
+
+class LoginRateThrottle(BaseThrottle):
+    """Token buckets per client IP and per username, checked before the password is hashed.
+
+    An attempt needs a token in every bucket; refused attempts take none.
+    Each worker keeps its own buckets, which never hold more than the shared
+    ones in the LOGIN_THROTTLE['CACHE'] cache (they only see this worker's
+    attempts), so an empty local bucket refuses without a cache round trip.
+    The shared read-modify-write is not atomic: concurrent workers may let a
+    few extra attempts through, which is fine for admission control. If the
+    cache is unreachable, the local buckets alone apply.
+    """
+
+    _local_buckets = {}
+    _local_lock = threading.Lock()
+
+    def allow_request(self, request, view):
+        conf = throttle_settings()
+        if not conf['ENABLED']:
+            return True
+
+        buckets = [(f"login:ip:{self.get_ident(request)}", conf['IP_BURST'], conf['IP_PER_MINUTE'])]
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if isinstance(username, str) and username:
+            digest = hashlib.md5(username.strip().lower().encode()).hexdigest()
+            buckets.append((f"login:user:{digest}", conf['USERNAME_BURST'], conf['USERNAME_PER_MINUTE']))
+
+        now = time.time()
+        with self._local_lock:
+            if not self._take(dict(self._local_buckets), buckets, now):
+                return False
+
+        try:
+            cache = caches[conf['CACHE']]
+            shared = cache.get_many([key for key, _, _ in buckets])
+            if not self._take(shared, buckets, now):
+                return False
+            # A bucket left alone this long is full again and need not be stored
+            timeout = max(60.0 * burst / per_minute for _, burst, per_minute in buckets)
+            cache.set_many({key: shared[key] for key, _, _ in buckets}, timeout=int(timeout) + 1)
+        except Exception:
+            logger.warning("Login throttle cache unavailable; using per-worker limits only", exc_info=True)
+
+        with self._local_lock:
+            if len(self._local_buckets) > LOCAL_MAX_BUCKETS:
+                # Bounds memory under username spraying; the shared buckets still apply
+                self._local_buckets.clear()
+            self._take(self._local_buckets, buckets, now)
+        return True
+
+    def get_ident(self, request):
+        # DRF trusts X-Forwarded-For whole when NUM_PROXIES is unset; a client could rotate it freely
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get('REMOTE_ADDR')
+        return super().get_ident(request)
+
+    def _take(self, states, buckets, now):
+        """Takes one token from every bucket in states, or none and sets the wait if one is empty."""
+        levels = [_refill(states.get(key), burst, per_minute, now) for key, burst, per_minute in buckets]
+        short = [
+            (1.0 - tokens) * 60.0 / per_minute
+            for tokens, (_, _, per_minute) in zip(levels, buckets) if tokens < 1.0
+        ]
+        if short:
+            self.wait_seconds = max(short)
+            return False
+        for tokens, (key, _, _) in zip(levels, buckets):
+            states[key] = (tokens - 1.0, now)
+        return True
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
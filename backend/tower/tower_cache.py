@@ -0,0 +1,224 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlsplit
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_BYTES': 64 * 1024 * 1024,
+    'DEFAULT_TTL': 30,
+    # Seconds a cached response is served without asking Tower again, per API resource
+    'TTLS': {
+        'credential_types': 300,
+        'credentials': 60,
+        'execution_environments': 300,
+    },
+}
+
+
+def cache_settings():
+    """Returns the TOWER_CACHE settings merged over the defaults."""
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, 'TOWER_CACHE', {}))
+    return conf
+
+
+def resource_of(path):
+    """'/api/v2/credential_types/?name=x' (or an absolute URL) -> 'credential_types'"""
+    parts = [p for p in urlsplit(path).path.split('/') if p]
+    if len(parts) >= 3 and parts[0] == 'api':
+        return parts[2]
+    return parts[-1] if parts else ''
+
+
+class CacheEntry:
+    __slots__ = ('payload', 'size', 'expires_at', 'etag', 'last_modified')
+
+    def __init__(self, payload, size, expires_at, etag=None, last_modified=None):
+        self.payload = payload
+        self.size = size
+        self.expires_at = expires_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def is_fresh(self):
+        return time.monotonic() < self.expires_at
+
+    @property
+    def can_revalidate(self):
+        return bool(self.etag or self.last_modified)
+
+
+class TowerCache:
+    """Byte-bounded LRU of decoded Tower GET responses.
+
+    Keys are (client key, path, query), with the query gathered from both the
+    URL and params, so a page requested as ('/api/v2/x/', {'page': 2}) and
+    through an absolute 'next' link share one entry and one invalidation
+    prefix. Expired entries are kept so they can be
+    revalidated with If-None-Match / If-Modified-Since; LRU eviction is what
+    actually frees memory once MAX_BYTES is reached.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(client_key, path, params=None):
+        url = urlsplit(path)
+        query = parse_qsl(url.query, keep_blank_values=True)
+        query.extend((key, str(value)) for key, value in (params or {}).items())
+        return (client_key, url.path, tuple(sorted(query)))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, payload, size, ttl, etag=None, last_modified=None):
+        max_bytes = self.max_bytes or cache_settings()['MAX_BYTES']
+        if size > max_bytes:
+            return
+        entry = CacheEntry(payload, size, time.monotonic() + ttl, etag, last_modified)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.size
+            self._entries[key] = entry
+            self.current_bytes += size
+            while self.current_bytes > max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.size
+
+    def touch(self, key, ttl):
+        """Extends an entry's freshness after a 304 Not Modified."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires_at = time.monotonic() + ttl
+
+    def invalidate(self, client_key=None, path_prefix=None):
+        """Drops entries of one client (or all clients), optionally limited to a path prefix."""
+        if path_prefix is not None:
+            path_prefix = urlsplit(path_prefix).path
+        with self._lock:
+            for key in list(self._entries):
+                if client_key is not None and key[0] != client_key:
+                    continue
+                if path_prefix is not None and not key[1].startswith(path_prefix):
+                    continue
+                self.current_bytes -= self._entries.pop(key).size
+
+    def clear(self):
+        self.invalidate()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SingleFlight:
+    """Collapses concurrent fetches of the same key into one call whose result all callers share."""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: concurrent awaits of the same key share one fetch.
+
+    Waiting callers are suspended on a future instead of blocking a thread.
+    Calls are tracked per event loop, since a future belongs to one loop.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        loop = asyncio.get_running_loop()
+        calls = self._calls.setdefault(loop, {})
+        future = calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = calls[key] = loop.create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # e.g. the leading request's client went away; don't leave followers waiting forever
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved so the loop does not warn when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del calls[key]
+            if not calls:
+                self._calls.pop(loop, None)
+
+
+inventory_cache = TowerCache()
+in_flight_fetches = SingleFlight()
+async_in_flight_fetches = AsyncSingleFlight()
+
+
+def ttl_for(path):
+    conf = cache_settings()
+    return conf['TTLS'].get(resource_of(path), conf['DEFAULT_TTL'])
+
+
+def invalidate_tower_cache(target=None, path_prefix=None):
+    """Invalidation hook for code that writes to Tower.
+
+    target is a TowerInstance/TowerConfig (or None for every tower); path_prefix
+    narrows it to one resource, e.g. '/api/v2/credential_types/'.
+    """
+    client_key = None
+    if target is not None:
+        client_key = (target.__class__.__name__, target.pk)
+    inventory_cache.invalidate(client_key, path_prefix)
@@ -0,0 +1,601 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import connections
+
+from .tower_cache import inventory_cache, in_flight_fetches, async_in_flight_fetches, cache_settings, ttl_for
+from .circuit_breaker import get_breaker, CircuitOpenError, OPEN, CLOSED
+from .metrics import record_tower_call
+
+# Tower/AAP clusters commonly run with self-signed certificates
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+DEFAULTS = {
+    'POOL_CONNECTIONS': 10,   # number of distinct hosts kept in the pool
+    'POOL_MAXSIZE': 10,       # keep-alive connections kept per host
+    'POOL_BLOCK': True,       # wait for a free connection instead of exceeding POOL_MAXSIZE
+    'CONNECT_TIMEOUT': 5,
+    'READ_TIMEOUT': 10,
+    'VERIFY_SSL': False,
+    'MAX_RETRIES': 0,
+    'FANOUT_WORKERS': 16,     # upper bound on concurrent calls made by fan_out()
+    'PAGE_SIZE': 200,         # page_size requested when walking paginated lists (AAP max is 200)
+    'MAX_IN_FLIGHT': 10,      # concurrent requests allowed per Tower
+    'ACQUIRE_TIMEOUT': 5,     # seconds to wait for an in-flight slot before giving up
+    'ASYNC_MAX_IN_FLIGHT': 100,  # MAX_IN_FLIGHT of AsyncTowerClient; waiting calls cost no thread
+}
+
+
+def client_settings():
+    """Returns the TOWER_CLIENT settings merged over the defaults."""
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, 'TOWER_CLIENT', {}))
+    return conf
+
+
+class TowerClient:
+    """Keep-alive HTTP session bound to a single Tower base URL and login."""
+
+    def __init__(self, base_url, username, password, key=None, **options):
+        conf = client_settings()
+        conf.update(options)
+
+        self.key = key
+        self.base_url = base_url.rstrip('/')
+        self.label = urlsplit(self.base_url).netloc  # 'instance' label of its call metrics
+        self.timeout = (conf['CONNECT_TIMEOUT'], conf['READ_TIMEOUT'])
+
+        self.session = requests.Session()
+        self.session.auth = (username, password)
+        self.session.verify = conf['VERIFY_SSL']
+
+        adapter = HTTPAdapter(
+            pool_connections=conf['POOL_CONNECTIONS'],
+            pool_maxsize=conf['POOL_MAXSIZE'],
+            pool_block=conf['POOL_BLOCK'],
+            max_retries=conf['MAX_RETRIES'],
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.in_flight = threading.BoundedSemaphore(conf['MAX_IN_FLIGHT'])
+        self.acquire_timeout = conf['ACQUIRE_TIMEOUT']
+        self.breaker = get_breaker(key, _reflect_breaker_state) if key is not None else None
+
+    def build_url(self, path):
+        """Accepts either an API path ('/api/v2/ping/') or an absolute URL (e.g. a 'next' link)."""
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return self.base_url + '/' + path.lstrip('/')
+
+    def request(self, method, path, timeout=None, **kwargs):
+        """Sends a request through the in-flight limiter and circuit breaker.
+
+        Raises TowerBusyError / CircuitOpenError (both requests ConnectionErrors)
+        without touching the network when the Tower is saturated or failing.
+        """
+        if not self.in_flight.acquire(timeout=self.acquire_timeout):
+            record_tower_call(self.label, method, path, 'busy')
+            raise TowerBusyError(f"Too many in-flight requests to {self.base_url}.")
+        try:
+            if self.breaker is not None and not self.breaker.allow():
+                record_tower_call(self.label, method, path, 'circuit_open')
+                raise CircuitOpenError(f"Circuit open for {self.base_url}; Tower is failing, not calling it.")
+            started = time.perf_counter()
+            success = None  # no verdict if interrupted
+            try:
+                response = self.session.request(
+                    method,
+                    self.build_url(path),
+                    timeout=timeout or self.timeout,
+                    **kwargs
+                )
+                success = response.status_code < 500
+            except Exception as e:
+                success = False
+                if isinstance(e, requests.exceptions.RequestException):
+                    record_tower_call(self.label, method, path, _failure_outcome(e), time.perf_counter() - started)
+                raise
+            finally:
+                # Always report back, or a half-open breaker would wait for this probe
+                if self.breaker is not None:
+                    self.breaker.record(success)
+            retries = getattr(response.raw, 'retries', None)
+            record_tower_call(
+                self.label, method, path, f'{response.status_code // 100}xx', time.perf_counter() - started,
+                sent=len(response.request.body or b''),
+                received=len(response.content),
+                retries=len(retries.history) if retries is not None else 0,
+            )
+            return response
+        finally:
+            self.in_flight.release()
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def get_json(self, path, params=None, use_cache=True):
+        """GETs a JSON document through the shared inventory cache.
+
+        Fresh hits are answered from memory; stale entries are revalidated with
+        If-None-Match / If-Modified-Since when Tower sent validators, and callers
+        missing the same key at the same time share one request. The returned
+        object is shared with the cache and must not be mutated.
+        Raises requests exceptions like get() + raise_for_status().
+        """
+        if not use_cache or self.key is None or not cache_settings()['ENABLED']:
+            response = self.get(path, params=params)
+            response.raise_for_status()
+            return response.json()
+
+        cache_key = inventory_cache.make_key(self.key, path, params)
+        entry = inventory_cache.get(cache_key)
+        if entry is not None and entry.is_fresh:
+            return entry.payload
+        return in_flight_fetches.do(cache_key, lambda: self._fetch_json(cache_key, entry, path, params))
+
+    def _fetch_json(self, cache_key, entry, path, params):
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        response = self.get(path, params=params, headers=headers)
+        ttl = ttl_for(path)
+        if response.status_code == 304 and entry is not None:
+            inventory_cache.touch(cache_key, ttl)
+            return entry.payload
+
+        response.raise_for_status()
+        payload = response.json()
+        inventory_cache.set(
+            cache_key,
+            payload,
+            size=len(response.content),
+            ttl=ttl,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+        )
+        return payload
+
+    def iter_pages(self, path, params=None, use_cache=True):
+        """Yields the 'results' list of every page of a Tower list endpoint.
+
+        Follows 'next' links; page N+1 is requested on a background thread while
+        the caller is still consuming page N, so only two pages are held at once.
+        """
+        params = dict(params or {})
+        params.setdefault('page_size', client_settings()['PAGE_SIZE'])
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='tower-prefetch') as pool:
+            future = pool.submit(self.get_json, path, params, use_cache)
+            while future is not None:
+                page = future.result()
+                next_url = page.get('next')
+                # 'next' already carries page and page_size in its query string
+                future = pool.submit(self.get_json, next_url, None, use_cache) if next_url else None
+                yield page.get('results', [])
+
+    def close(self):
+        self.session.close()
+
+
+class TowerBusyError(requests.exceptions.ConnectionError):
+    """Raised when no in-flight slot for a Tower frees up within ACQUIRE_TIMEOUT."""
+
+
+def _failure_outcome(error):
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection_error'
+    return 'error'
+
+
+def _reflect_breaker_state(key, previous, state):
+    """Mirrors breaker transitions of TowerInstance clients into TowerInstance.status."""
+    if key[0] != 'TowerInstance':
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        _apply_breaker_state(key, state)
+        return
+
+    # Reported by an AsyncTowerClient: the ORM must not run on the event loop
+    def apply():
+        try:
+            _apply_breaker_state(key, state)
+        finally:
+            connections.close_all()
+    threading.Thread(target=apply, name='breaker-status', daemon=True).start()
+
+
+def _apply_breaker_state(key, state):
+    from .models import TowerInstance
+    from .versioning import bump_table_version
+
+    updated = 0
+    if state == OPEN:
+        updated = TowerInstance.objects.filter(pk=key[1], status='active').update(status='unreachable')
+    elif state == CLOSED:
+        updated = TowerInstance.objects.filter(pk=key[1], status='unreachable').update(status='active')
+    if updated:
+        bump_table_version(TowerInstance)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+ADHOC_LABEL = 'ad-hoc'  # metrics 'instance' of unpooled clients, which would otherwise be labelled by user input
+
+
+def _client_for(key, base_url, username, password):
+    fingerprint = (base_url, username, password)
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+        if entry is not None:
+            # Connection details changed; drop the stale pool and anything it cached
+            entry[1].close()
+            inventory_cache.invalidate(key)
+        client = TowerClient(base_url, username, password, key=key)
+        _clients[key] = (fingerprint, client)
+        return client
+
+
+def get_client(target):
+    """Returns the shared pooled client for a TowerInstance or TowerConfig."""
+    base_url = getattr(target, 'url', None) or target.base_url
+    key = (target.__class__.__name__, target.pk)
+    client = _client_for(key, base_url, target.username, target.password)
+    _label(client, target)
+    return client
+
+
+def get_client_for_url(url, username, password):
+    """Returns a new, unpooled client for ad-hoc connection details (e.g. the test-connection form).
+
+    Only registered targets are pooled: ad-hoc URLs come from users, and
+    keeping a pool, breaker or cache entries per URL would let them grow
+    without limit. The caller closes the client when done.
+    """
+    client = TowerClient(url, username, password)
+    client.label = ADHOC_LABEL
+    return client
+
+
+def drop_client(target):
+    """Closes and forgets the pooled clients (sync and async) of a deleted or reconfigured target."""
+    key = (target.__class__.__name__, target.pk)
+    with _clients_lock:
+        entry = _clients.pop(key, None)
+        async_entries = [(k[1], _async_clients.pop(k)[1]) for k in list(_async_clients) if k[0] == key]
+    if entry is not None:
+        entry[1].close()
+    for loop, client in async_entries:
+        _close_async_client(loop, client)
+    inventory_cache.invalidate(key)
+
+
+class AsyncTowerClient:
+    """asyncio counterpart of TowerClient, for async views.
+
+    Waiting on Tower suspends a coroutine instead of holding a worker thread.
+    Uses the same settings, circuit breaker and inventory cache as the
+    TowerClient of the same target, and raises the same requests exceptions
+    (httpx errors are translated), so callers handle failures identically.
+    One instance per event loop; obtain it with get_async_client().
+    """
+
+    def __init__(self, base_url, username, password, key=None, **options):
+        conf = client_settings()
+        conf.update(options)
+
+        self.key = key
+        self.base_url = base_url.rstrip('/')
+        self.label = urlsplit(self.base_url).netloc
+        self.timeout = httpx.Timeout(conf['READ_TIMEOUT'], connect=conf['CONNECT_TIMEOUT'])
+
+        limits = httpx.Limits(
+            max_connections=conf['ASYNC_MAX_IN_FLIGHT'],
+            max_keepalive_connections=conf['POOL_MAXSIZE'],
+        )
+        self.session = httpx.AsyncClient(
+            auth=(username, password),
+            timeout=self.timeout,
+            follow_redirects=True,  # as requests does, e.g. for AAP 2.5's /api/v2/ -> /api/controller/v2/
+            transport=httpx.AsyncHTTPTransport(
+                verify=conf['VERIFY_SSL'],
+                limits=limits,
+                retries=conf['MAX_RETRIES'],
+            ),
+        )
+
+        self.in_flight = asyncio.Semaphore(conf['ASYNC_MAX_IN_FLIGHT'])
+        self.acquire_timeout = conf['ACQUIRE_TIMEOUT']
+        self.breaker = get_breaker(key, _reflect_breaker_state) if key is not None else None
+
+    build_url = TowerClient.build_url
+
+    async def request(self, method, path, timeout=None, **kwargs):
+        """Sends a request through the in-flight limiter and circuit breaker; see TowerClient.request()."""
+        try:
+            await asyncio.wait_for(self.in_flight.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            record_tower_call(self.label, method, path, 'busy')
+            raise TowerBusyError(f"Too many in-flight requests to {self.base_url}.")
+        try:
+            if self.breaker is not None and not self.breaker.allow():
+                record_tower_call(self.label, method, path, 'circuit_open')
+                raise CircuitOpenError(f"Circuit open for {self.base_url}; Tower is failing, not calling it.")
+            started = time.perf_counter()
+            success = None  # no verdict if cancelled, e.g. when the client disconnects
+            try:
+                response = await self.session.request(
+                    method,
+                    self.build_url(path),
+                    timeout=timeout or self.timeout,
+                    **kwargs
+                )
+                success = response.status_code < 500
+            except httpx.HTTPError as e:
+                success = False
+                timed_out = isinstance(e, httpx.TimeoutException)
+                record_tower_call(self.label, method, path, 'timeout' if timed_out else 'connection_error',
+                                  time.perf_counter() - started)
+                if timed_out:
+                    raise requests.exceptions.Timeout(str(e)) from e
+                raise requests.exceptions.ConnectionError(str(e)) from e
+            except Exception:
+                success = False
+                raise
+            finally:
+                # Always report back, or a half-open breaker would wait for this probe
+                if self.breaker is not None:
+                    self.breaker.record(success)
+            # httpx retries failed connects inside its transport without reporting them
+            record_tower_call(
+                self.label, method, path, f'{response.status_code // 100}xx', time.perf_counter() - started,
+                # After a redirect, request is the followed one, whose body is not buffered
+                sent=int(response.request.headers.get('Content-Length', 0)),
+                received=len(response.content),
+            )
+            return response
+        finally:
+            self.in_flight.release()
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    @staticmethod
+    def raise_for_status(response):
+        """Raises requests.HTTPError (with .response set to the httpx response) for 4xx/5xx answers."""
+        if response.is_error:
+            raise requests.exceptions.HTTPError(
+                f"{response.status_code} {response.reason_phrase} for url: {response.url}",
+                response=response,
+            )
+
+    async def get_json(self, path, params=None, use_cache=True):
+        """See TowerClient.get_json(); concurrent misses of the same key await one request."""
+        if not use_cache or self.key is None or not cache_settings()['ENABLED']:
+            response = await self.get(path, params=params)
+            self.raise_for_status(response)
+            return response.json()
+
+        cache_key = inventory_cache.make_key(self.key, path, params)
+        entry = inventory_cache.get(cache_key)
+        if entry is not None and entry.is_fresh:
+            return entry.payload
+        return await async_in_flight_fetches.do(cache_key, lambda: self._fetch_json(cache_key, entry, path, params))
+
+    async def _fetch_json(self, cache_key, entry, path, params):
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        response = await self.get(path, params=params, headers=headers)
+        ttl = ttl_for(path)
+        if response.status_code == 304 and entry is not None:
+            inventory_cache.touch(cache_key, ttl)
+            return entry.payload
+
+        self.raise_for_status(response)
+        payload = response.json()
+        inventory_cache.set(
+            cache_key,
+            payload,
+            size=len(response.content),
+            ttl=ttl,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+        )
+        return payload
+
+    async def iter_pages(self, path, params=None, use_cache=True, first_page=None):
+        """Async version of TowerClient.iter_pages(): page N+1 is fetched while page N is consumed.
+
+        first_page, a page of path the caller already fetched, is yielded first
+        and the walk continues from its 'next' link.
+        """
+        if first_page is None:
+            params = dict(params or {})
+            params.setdefault('page_size', client_settings()['PAGE_SIZE'])
+            first_page = await self.get_json(path, params, use_cache)
+
+        page, task = first_page, None
+        try:
+            while True:
+                next_url = page.get('next')
+                # 'next' already carries page and page_size in its query string
+                task = asyncio.ensure_future(self.get_json(next_url, None, use_cache)) if next_url else None
+                yield page.get('results', [])
+                if task is None:
+                    return
+                page = await task
+        finally:
+            if task is not None:
+                task.cancel()
+
+    async def close(self):
+        await self.session.aclose()
+
+
+_async_clients = {}
+
+
+def _close_async_client(loop, client):
+    # aclose() must run on the loop the client was created on
+    if loop.is_closed():
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        loop.create_task(client.close())
+    else:
+        asyncio.run_coroutine_threadsafe(client.close(), loop)
+
+
+def _async_client_for(key, base_url, username, password):
+    loop = asyncio.get_running_loop()
+    fingerprint = (base_url, username, password)
+    with _clients_lock:
+        entry = _async_clients.get((key, loop))
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+        if entry is not None:
+            inventory_cache.invalidate(key)
+            _close_async_client(loop, entry[1])
+        # Under WSGI every request runs on a fresh loop; forget clients of finished ones
+        for dead in [k for k in _async_clients if k[1].is_closed()]:
+            del _async_clients[dead]
+        client = AsyncTowerClient(base_url, username, password, key=key)
+        _async_clients[(key, loop)] = (fingerprint, client)
+        return client
+
+
+def get_async_client(target):
+    """Returns the AsyncTowerClient of a TowerInstance or TowerConfig for the running event loop.
+
+    Clients are bound to the loop they were created on, so each loop gets its own.
+    """
+    base_url = getattr(target, 'url', None) or target.base_url
+    key = (target.__class__.__name__, target.pk)
+    client = _async_client_for(key, base_url, target.username, target.password)
+    _label(client, target)
+    return client
+
+
+def _label(client, target):
+    # Tower instances are reported by name (renames apply to the next call); a TowerConfig by host
+    name = getattr(target, 'name', None)
+    if name:
+        client.label = name
+
+
+def get_async_client_for_url(url, username, password):
+    """Async counterpart of get_client_for_url(); the caller awaits close() when done."""
+    client = AsyncTowerClient(url, username, password)
+    client.label = ADHOC_LABEL
+    return client
+
+
+def _guarded(func):
+    def call(item):
+        try:
+            return item, func(item), None
+        except Exception as e:
+            return item, None, e
+        finally:
+            # Breaker transitions may have opened a DB connection on this worker thread
+            connections.close_all()
+    return call
+
+
+def fan_out(func, items, max_workers=None):
+    """Calls func(item) for every item concurrently on a bounded thread pool.
+
+    Returns a list of (item, result, error) tuples in the order of items; exactly
+    one of result/error is set. func should not need the database.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    workers = min(max_workers or client_settings()['FANOUT_WORKERS'], len(items))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tower-fanout') as pool:
+        return list(pool.map(_guarded(func), items))
+
+
+def iter_fan_out(func, items, max_workers=None):
+    """Like fan_out(), but yields each (item, result, error) as soon as it completes."""
+    items = list(items)
+    if not items:
+        return
+
+    workers = min(max_workers or client_settings()['FANOUT_WORKERS'], len(items))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tower-fanout') as pool:
+        futures = [pool.submit(_guarded(func), item) for item in items]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+async def async_fan_out(func, items, max_workers=None):
+    """Awaits func(item) for every item concurrently, at most max_workers at a time.
+
+    Returns a list of (item, result, error) tuples in the order of items, like fan_out().
+    """
+    limit = asyncio.Semaphore(max_workers or client_settings()['FANOUT_WORKERS'])
+
+    async def call(item):
+        async with limit:
+            try:
+                return item, await func(item), None
+            except Exception as e:
+                return item, None, e
+
+    return await asyncio.gather(*(call(item) for item in items))
+
+
+async def async_iter_fan_out(func, items, max_workers=None):
+    """Like async_fan_out(), but yields each (item, result, error) as soon as it completes."""
+    limit = asyncio.Semaphore(max_workers or client_settings()['FANOUT_WORKERS'])
+
+    async def call(item):
+        async with limit:
+            try:
+                return item, await func(item), None
+            except Exception as e:
+                return item, None, e
+
+    tasks = [asyncio.ensure_future(call(item)) for item in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
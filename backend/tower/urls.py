@@ -6,26 +6,40 @@ from .views import (
     CredentialViewSet,
     ExecutionEnvironmentViewSet,
     AuditLogViewSet,
-    TowerCredentialProxy,
+    CredentialTypeViewSet,
     UserViewSet,
     user_info,
     login_view,
+    refresh_view,
     logout_view
 )
+from .async_views import (
+    tower_credentials,
+    test_connection,
+    credential_type_status,
+    duplicate_missing_credential_type,
+    verify_credential_type_by_name
+)
 
 router = DefaultRouter()
 
-router.register(r'tower-credentials', TowerCredentialProxy, basename='tower-credentials')
 router.register(r'tower', TowerInstanceViewSet, basename='tower')
 router.register(r'instances', TowerInstanceViewSet, basename='instance')
 router.register(r'credentials', CredentialViewSet)
 router.register(r'environments', ExecutionEnvironmentViewSet)
 router.register(r'audit-logs', AuditLogViewSet)
+router.register(r'credential-types', CredentialTypeViewSet)
 router.register(r'users', UserViewSet, basename='user')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('user-info/', user_info),
     path('login/', login_view),
+    path('refresh/', refresh_view),
     path('logout/', logout_view),
+    path('tower-credentials/', tower_credentials),
+    path('test-connection/', test_connection),
+    path('credential-type-status/', credential_type_status),
+    path('duplicate-credential-type/', duplicate_missing_credential_type),
+    path('verify-credential-type/', verify_credential_type_by_name),
 ]
\ No newline at end of file
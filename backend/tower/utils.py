@@ -1,13 +1,34 @@
+from datetime import timedelta
+
 from .models import AuditLog
+from .audit import audit_writer
 from django.utils.timezone import now
 
-def log_action(user, action, obj, changes=None):
-    AuditLog.objects.create(
+def _entry(user, action, obj, changes, timestamp):
+    return AuditLog(
         user=user or "System",
         action=action,
         object_type=obj.__class__.__name__,
         object_id=obj.pk,
         object_repr=str(obj),
-        timestamp=now(),
+        timestamp=timestamp,
         changes=changes or {}
-    )
\ No newline at end of file
+    )
+
+def log_action(user, action, obj, changes=None):
+    """Queues an audit entry; see audit.AuditWriter for when it reaches the database."""
+    audit_writer.enqueue(_entry(user, action, obj, changes, now()))
+
+def log_actions(user, action, objs, changes=None):
+    """Queues one audit entry per object in a single batch; changes is an optional list aligned with objs.
+
+    Entries are a microsecond apart: the audit log cursor pages on timestamp,
+    and a bulk request's thousands of equal timestamps would make it fall back
+    to offsets.
+    """
+    started = now()
+    changes = changes or [None] * len(objs)
+    audit_writer.enqueue_many([
+        _entry(user, action, obj, obj_changes, started + timedelta(microseconds=n))
+        for n, (obj, obj_changes) in enumerate(zip(objs, changes))
+    ])
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+
+from .models import TableVersion, AuditLog, TowerInstance, Credential, ExecutionEnvironment
+
+
+# Tables whose list/detail responses carry version-derived ETags
+VERSIONED_MODELS = (TowerInstance, Credential, ExecutionEnvironment, AuditLog)
+
+
+class _Bump:
+    """on_commit callback; keeps the table name so one transaction schedules it only once."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def __call__(self):
+        versions = TableVersion.objects.filter(table=self.table)
+        if versions.update(version=F('version') + 1):
+            return
+        _, created = TableVersion.objects.get_or_create(table=self.table)
+        if not created:
+            versions.update(version=F('version') + 1)
+
+
+def bump_table_version(*models):
+    """Records that rows of models changed.
+
+    The counters move when the current transaction commits (immediately in
+    autocommit), so a reader never sees a new version next to old rows. Each
+    table is bumped once per transaction however many rows it touched.
+    """
+    connection = transaction.get_connection()
+    for model in models:
+        table = model._meta.db_table
+        if connection.in_atomic_block and any(
+            getattr(entry[1], 'table', None) == table for entry in connection.run_on_commit
+        ):
+            continue
+        transaction.on_commit(_Bump(table))
+
+
+def table_versions(*models):
+    """Returns the current counters of models, in order; 0 for tables never written to."""
+    tables = [model._meta.db_table for model in models]
+    versions = dict(TableVersion.objects.filter(table__in=tables).values_list('table', 'version'))
+    return [versions.get(table, 0) for table in tables]
+
+
+def version_saved(sender, raw=False, **kwargs):
+    if not raw:
+        bump_table_version(sender)
+
+
+def version_deleted(sender, **kwargs):
+    bump_table_version(sender)
+
+
+# Row-by-row writes, including cascades and the admin site; bulk_create(),
+# bulk_update() and update() send no signals and bump explicitly. Connected
+# per model so other models keep Django's fast deletes.
+for _model in VERSIONED_MODELS:
+    post_save.connect(version_saved, sender=_model)
+    post_delete.connect(version_deleted, sender=_model)
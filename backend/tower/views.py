@@ -1,25 +1,35 @@
-from django.shortcuts import render
-import requests
-import urllib3
+from django.shortcuts import render, get_object_or_404
+from django.http import StreamingHttpResponse
 
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, throttle_classes, action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.contrib.auth import get_user_model
 
-from .models import TowerConfig, TowerInstance, Credential, ExecutionEnvironment, AuditLog
+from .models import TowerInstance, Credential, CredentialType, ExecutionEnvironment, AuditLog
 from .serializers import (
     TowerInstanceSerializer,
     CredentialSerializer,
+    CredentialTypeSerializer,
     ExecutionEnvironmentSerializer,
     AuditLogSerializer,
     UserSerializer
 )
-from .utils import log_action
+from .mixins import AuditedModelMixin, SparseFieldsMixin, BulkMixin, ConditionalGetMixin
+from .pagination import AuditLogCursorPagination
+from .filters import filter_audit_logs
+from .audit_export import iter_audit_export
+from .tower_client import drop_client
+from .circuit_breaker import find_breaker
+from .metrics import tower_call_stats
 from .permissions import IsAdmin, ReadOnlyForViewer
+from .throttling import LoginRateThrottle
+from .authentication import RoleClaimsRefreshToken, session_expired
 
 User = get_user_model()
 
@@ -29,6 +39,8 @@ User = get_user_model()
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@authentication_classes([])  # a stale or revoked token in the header must not block signing in
+@throttle_classes([LoginRateThrottle])  # checked before authenticate() spends CPU on the password hash
 def login_view(request):
     """Login endpoint that returns JWT tokens"""
     username = request.data.get('username')
@@ -43,7 +55,7 @@ def login_view(request):
     user = authenticate(username=username, password=password)
     
     if user is not None:
-        refresh = RefreshToken.for_user(user)
+        refresh = RoleClaimsRefreshToken.for_user(user)
         return Response({
             'access': str(refresh.access_token),
             'refresh': str(refresh),
@@ -61,6 +73,49 @@ def login_view(request):
         )
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@authentication_classes([])
+def refresh_view(request):
+    """Trades a refresh token for a new token pair without checking the password again.
+
+    Claims are re-read from the user row, so tokens revoked by a role change
+    come back with the new role. With ROTATE_REFRESH_TOKENS the old refresh
+    token is blacklisted and each call extends the session, up to
+    SESSION_MAX_LIFETIME after the original login.
+    """
+    raw_token = request.data.get('refresh')
+    if not raw_token:
+        return Response({'error': 'Refresh token is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        old_refresh = RoleClaimsRefreshToken(raw_token)
+    except TokenError:
+        return Response({'error': 'Invalid or expired refresh token'}, status=status.HTTP_401_UNAUTHORIZED)
+    if session_expired(old_refresh):
+        return Response({'error': 'Session expired, please sign in again'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    user = User.objects.filter(pk=old_refresh[jwt_settings.USER_ID_CLAIM], is_active=True).first()
+    if user is None:
+        return Response({'error': 'Invalid or expired refresh token'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    refresh = RoleClaimsRefreshToken.for_user(user, session_start=old_refresh.get('session_start'))
+    data = {
+        'access': str(refresh.access_token),
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'role': user.role
+        }
+    }
+    if jwt_settings.ROTATE_REFRESH_TOKENS:
+        if jwt_settings.BLACKLIST_AFTER_ROTATION:
+            old_refresh.blacklist()
+        data['refresh'] = str(refresh)
+    return Response(data)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout_view(request):
@@ -68,7 +123,7 @@ def logout_view(request):
     try:
         refresh_token = request.data.get('refresh')
         if refresh_token:
-            token = RefreshToken(refresh_token)
+            token = RoleClaimsRefreshToken(refresh_token)
             token.blacklist()
         return Response({'message': 'Logged out successfully'})
     except Exception as e:
@@ -82,6 +137,7 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdmin]  # Only admins can perform CRUD
+    # Role, activation and password changes revoke the user's tokens (see authentication.revoke_on_user_change)
 
 
 @api_view(['GET'])
@@ -96,139 +152,116 @@ def user_info(request):
     })
 
 
-# Disable insecure request warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-
-# -----------------------
-# Tower Credential Proxy
-# -----------------------
-class TowerCredentialProxy(viewsets.ViewSet):
-    """Proxies credential list calls to Ansible Tower using DB-stored credentials."""
-    permission_classes = [IsAuthenticated]
-
-    def list(self, request):
-        cfg = TowerConfig.objects.first()
-        if not cfg:
-            return Response(
-                {"detail": "TowerConfig not configured."},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
-            )
-
-        tower_url = cfg.base_url.rstrip('/') + '/api/v2/credentials/'
-        try:
-            resp = requests.get(
-                tower_url,
-                auth=(cfg.username, cfg.password),
-                timeout=10,
-                verify=False
-            )
-            resp.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            print("Tower proxy error:", e)
-            return Response(
-                {"detail": f"Error contacting Tower: {e}"},
-                status=status.HTTP_502_BAD_GATEWAY
-            )
-
-        results = resp.json().get('results', [])
-        return Response(results)
-
-
 # -----------------------
 # Tower Instance
 # -----------------------
-class TowerInstanceViewSet(viewsets.ModelViewSet):
+class TowerInstanceViewSet(ConditionalGetMixin, SparseFieldsMixin, BulkMixin, AuditedModelMixin, viewsets.ModelViewSet):
     queryset = TowerInstance.objects.all()
     serializer_class = TowerInstanceSerializer
     permission_classes = [IsAuthenticated]
 
-    def perform_update(self, serializer):
-        old_instance = TowerInstance.objects.get(pk=serializer.instance.pk)
-        new_instance = serializer.save()
-
-        changes = {}
-        for field in serializer.fields:
-            old_val = getattr(old_instance, field, None)
-            new_val = getattr(new_instance, field, None)
-            if old_val != new_val:
-                changes[field] = {'from': old_val, 'to': new_val}
-
-        log_action(user=self.request.user.username, action='updated', obj=new_instance, changes=changes)
-
-    def perform_create(self, serializer):
-        instance = serializer.save()
-        log_action(user=self.request.user.username, action='created', obj=instance)
-
     def perform_destroy(self, instance):
-        log_action(user=self.request.user.username, action='deleted', obj=instance)
-        instance.delete()
+        drop_client(instance)
+        super().perform_destroy(instance)
+
+    def perform_bulk_destroy(self, objs):
+        for instance in objs:
+            drop_client(instance)
+        super().perform_bulk_destroy(objs)
+
+    @staticmethod
+    def _breaker_state(instance):
+        breaker = find_breaker(('TowerInstance', instance.pk))
+        state = breaker.snapshot() if breaker else {'state': 'closed', 'calls_in_window': 0,
+                                                     'failures_in_window': 0, 'retry_in_seconds': None}
+        return {'id': instance.pk, 'name': instance.name, 'status': instance.status, 'circuit': state}
+
+    @action(detail=False, methods=['get'], url_path='circuit-breakers')
+    def circuit_breakers(self, request):
+        """Circuit breaker state of every Tower instance."""
+        instances = self.get_queryset().only('id', 'name', 'status')
+        return Response([self._breaker_state(instance) for instance in instances])
+
+    @action(detail=True, methods=['get', 'delete'], url_path='circuit-breaker')
+    def circuit_breaker(self, request, pk=None):
+        """GET shows one instance's breaker; DELETE force-closes it."""
+        instance = self.get_object()
+        if request.method == 'DELETE':
+            if not IsAdmin().has_permission(request, self):
+                return Response({'detail': 'Only admins can reset circuit breakers.'}, status=status.HTTP_403_FORBIDDEN)
+            breaker = find_breaker(('TowerInstance', instance.pk))
+            if breaker:
+                breaker.reset()
+            instance.refresh_from_db(fields=['status'])
+        return Response(self._breaker_state(instance))
+
+    @action(detail=False, methods=['get'], url_path='tower-calls', permission_classes=[IsAdmin])
+    def tower_calls(self, request):
+        """Latency, errors and traffic of the calls made to each Tower, per API path (?tower_instance=name)."""
+        return Response(tower_call_stats(request.query_params.get('tower_instance')))
 
 
 # -----------------------
 # Credentials
 # -----------------------
-class CredentialViewSet(viewsets.ModelViewSet):
+class CredentialViewSet(ConditionalGetMixin, SparseFieldsMixin, BulkMixin, AuditedModelMixin, viewsets.ModelViewSet):
     queryset = Credential.objects.all()
     serializer_class = CredentialSerializer
     permission_classes = [IsAuthenticated]
+    etag_models = (TowerInstance,)  # ?expand=tower_instance
 
-    def perform_update(self, serializer):
-        old_instance = Credential.objects.get(pk=serializer.instance.pk)
-        new_instance = serializer.save()
 
-        changes = {}
-        for field in serializer.fields:
-            old_val = getattr(old_instance, field, None)
-            new_val = getattr(new_instance, field, None)
-            if old_val != new_val:
-                changes[field] = {'from': old_val, 'to': new_val}
-
-        log_action(user=self.request.user.username, action='updated', obj=new_instance, changes=changes)
-
-    def perform_create(self, serializer):
-        instance = serializer.save()
-        log_action(user=self.request.user.username, action='created', obj=instance)
-
-    def perform_destroy(self, instance):
-        log_action(user=self.request.user.username, action='deleted', obj=instance)
-        instance.delete()
+# -----------------------
+# Credential Types
+# -----------------------
+class CredentialTypeViewSet(AuditedModelMixin, viewsets.ModelViewSet):
+    """Canonical credential types, compared against every Tower by credential_type_status."""
+    queryset = CredentialType.objects.all()
+    serializer_class = CredentialTypeSerializer
+    permission_classes = [IsAuthenticated]
 
 
 # -----------------------
 # Execution Environments
 # -----------------------
-class ExecutionEnvironmentViewSet(viewsets.ModelViewSet):
+class ExecutionEnvironmentViewSet(ConditionalGetMixin, SparseFieldsMixin, BulkMixin, AuditedModelMixin, viewsets.ModelViewSet):
     queryset = ExecutionEnvironment.objects.all()
     serializer_class = ExecutionEnvironmentSerializer
     permission_classes = [IsAuthenticated]
+    etag_models = (TowerInstance,)  # ?expand=tower_instance
 
-    def perform_update(self, serializer):
-        old_instance = ExecutionEnvironment.objects.get(pk=serializer.instance.pk)
-        new_instance = serializer.save()
 
-        changes = {}
-        for field in serializer.fields:
-            old_val = getattr(old_instance, field, None)
-            new_val = getattr(new_instance, field, None)
-            if old_val != new_val:
-                changes[field] = {'from': old_val, 'to': new_val}
+# -----------------------
+# Audit Logs
+# -----------------------
+class AuditLogViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    """Audit trail, newest first, cursor-paginated.
+
+    Filters: see filters.filter_audit_logs.
+    """
+    queryset = AuditLog.objects.all().order_by('-timestamp', '-id')
+    serializer_class = AuditLogSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = AuditLogCursorPagination
 
-        log_action(user=self.request.user.username, action='updated', obj=new_instance, changes=changes)
+    def get_queryset(self):
+        return filter_audit_logs(super().get_queryset(), self.request.query_params)
 
-    def perform_create(self, serializer):
-        instance = serializer.save()
-        log_action(user=self.request.user.username, action='created', obj=instance)
+    @action(detail=False, methods=['get'], permission_classes=[IsAdmin])
+    def export(self, request):
+        """Streams every matching entry in id order as NDJSON (default) or CSV (?output=csv).
 
-    def perform_destroy(self, instance):
-        log_action(user=self.request.user.username, action='deleted', obj=instance)
-        instance.delete()
+        ?gzip=1 compresses the stream; ?after_id= resumes an interrupted export.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in ('ndjson', 'csv'):
+            raise ValidationError({'output': "Must be 'ndjson' or 'csv'."})
+        compress = request.query_params.get('gzip') in ('1', 'true')
 
+        queryset = filter_audit_logs(AuditLog.objects.all(), request.query_params)
+        filename = f"audit-log.{output}" + ('.gz' if compress else '')
+        content_type = 'application/gzip' if compress else ('text/csv' if output == 'csv' else 'application/x-ndjson')
 
-# -----------------------
-# Audit Logs
-# -----------------------
-class AuditLogViewSet(viewsets.ModelViewSet):
-    queryset = AuditLog.objects.all().order_by('-timestamp')
-    serializer_class = AuditLogSerializer
-    permission_classes = [IsAuthenticated]
\ No newline at end of file
+        response = StreamingHttpResponse(iter_audit_export(queryset, output, compress), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -28,15 +29,18 @@ INSTALLED_APPS = [
     'corsheaders',
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',  # rotated and logged-out refresh tokens
 ]
 
 MIDDLEWARE = [
+    'tower.metrics.MetricsMiddleware',  # first, so its timings cover the whole stack
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS should be high in the list
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tower.audit.AuditContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,15 +71,57 @@ TEMPLATES = [
     },
 ]
 
+# Production runs the ASGI application (uvicorn tower_admin.asgi:application); the
+# Tower-facing views are async and lose their streaming and connection reuse under WSGI
+ASGI_APPLICATION = 'tower_admin.asgi.application'
 WSGI_APPLICATION = 'tower_admin.wsgi.application'
 
-# Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database, configured from the environment:
+#   DB_ENGINE        sqlite (default) or postgresql
+#   DB_NAME          SQLite file path, or PostgreSQL database name
+#   DB_USER, DB_PASSWORD, DB_HOST, DB_PORT    PostgreSQL only
+#   DB_CONN_MAX_AGE  seconds a connection is kept open across requests (0 closes it after each)
+#   SQLITE_WAL       1 (default) enables WAL journaling and the pragmas below; 0 restores SQLite's defaults
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '600'))
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'tower_admin'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            # Persistent connections are pinged before reuse instead of failing the request
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        }
+    }
+    if os.environ.get('SQLITE_WAL', '1') == '1':
+        DATABASES['default']['OPTIONS'] = {
+            # Readers no longer block the writer (and vice versa); writers wait
+            # for the lock instead of failing, and take it when the transaction
+            # starts rather than upgrading mid-transaction (which can deadlock)
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA busy_timeout=5000;'
+                'PRAGMA mmap_size=134217728;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        }
 
 # Custom User Model
 AUTH_USER_MODEL = 'tower.CustomUser'
@@ -83,14 +129,29 @@ AUTH_USER_MODEL = 'tower.CustomUser'
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Stateless: request.user is built from the token's claims (see tower/authentication.py)
+        'tower.authentication.StatelessJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'tower.pagination.BoundedCursorPagination',
+    'PAGE_SIZE': 100,
+    # Reverse proxies in front of the app. Client IPs (login throttling) are read from
+    # X-Forwarded-For only this many hops deep; 0 uses REMOTE_ADDR, as a forged header is then all there is
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
 }
 
+# Upper bound for ?page_size= on every list endpoint
+MAX_PAGE_SIZE = 1000
+# Seconds an approximate ?count=1 total is cached
+PAGINATION_COUNT_TTL = 60
+
+# Limits of the <resource>/bulk/ endpoints
+BULK_MAX_ITEMS = 5000
+BULK_BATCH_SIZE = 500
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=24),
@@ -109,6 +170,129 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Sliding sessions: /api/refresh/ keeps a session alive without the password
+# for at most this long after the original login
+SESSION_MAX_LIFETIME = timedelta(days=30)
+
+# Refresh-token blacklist (see tower/blacklist.py); prune it with
+# `python manage.py prune_token_blacklist --loop 3600`
+TOKEN_BLACKLIST = {
+    'FILTER_ENABLED': True,
+    'FILTER_CAPACITY': 100000,
+    'FILTER_ERROR_RATE': 0.001,
+    'FILTER_REFRESH': 2,
+    'FILTER_REBUILD': 3600,
+    'PRUNE_BATCH_SIZE': 1000,
+}
+
+# Seconds a worker may keep using its copy of the token revocation list
+TOKEN_REVOCATION_TTL = 5
+
+# Outbound Tower/AAP HTTP client (see tower/tower_client.py)
+TOWER_CLIENT = {
+    'POOL_CONNECTIONS': 10,
+    'POOL_MAXSIZE': 10,
+    'POOL_BLOCK': True,
+    'CONNECT_TIMEOUT': 5,
+    'READ_TIMEOUT': 10,
+    'VERIFY_SSL': False,
+    'MAX_RETRIES': 0,
+    'FANOUT_WORKERS': 16,
+    'PAGE_SIZE': 200,
+    'MAX_IN_FLIGHT': 10,
+    'ACQUIRE_TIMEOUT': 5,
+}
+
+# Per-Tower circuit breaker (see tower/circuit_breaker.py)
+TOWER_CIRCUIT_BREAKER = {
+    'WINDOW': 60,
+    'MIN_CALLS': 5,
+    'FAILURE_RATE': 0.5,
+    'OPEN_SECONDS': 30,
+    'HALF_OPEN_CALLS': 1,
+    'PROBE_TIMEOUT': 60,
+}
+
+# In-memory cache of Tower GET responses (see tower/tower_cache.py)
+TOWER_CACHE = {
+    'ENABLED': True,
+    'MAX_BYTES': 64 * 1024 * 1024,
+    'DEFAULT_TTL': 30,
+    'TTLS': {
+        'credential_types': 300,
+        'credentials': 60,
+        'execution_environments': 300,
+    },
+}
+
+# Local mirror of Tower inventories, kept current by `manage.py sync_tower_inventory`
+TOWER_MIRROR = {
+    'MAX_STALENESS': 600,
+}
+
+# Audit log writer (see tower/audit.py)
+AUDIT_LOG = {
+    'ASYNC': True,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,
+    'SPOOL_PATH': BASE_DIR / 'audit_spool.jsonl',
+}
+
+# Request metrics served at /metrics (see tower/metrics.py). Every worker
+# writes its series to DIRECTORY, and a scrape of any worker returns the sum.
+# With METRICS_TOKEN set, scrapes must send it even from ALLOWED_IPS.
+METRICS = {
+    'DIRECTORY': os.environ.get('METRICS_DIR', BASE_DIR / 'metrics'),
+    'FLUSH_INTERVAL': 5.0,
+    'ALLOWED_IPS': ('127.0.0.1', '::1'),
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+}
+
+# Caches. 'shared' is seen by every worker process; its table is created by
+# migration tower 0008 (run `python manage.py createcachetable` for caches added later)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'tower_shared_cache',
+    },
+}
+
+# Token buckets in front of /api/login/ (see tower/throttling.py)
+LOGIN_THROTTLE = {
+    'CACHE': 'shared',
+    'IP_BURST': 20,
+    'IP_PER_MINUTE': 10,
+    'USERNAME_BURST': 5,
+    'USERNAME_PER_MINUTE': 2,
+}
+
+# Password hashing (see tower/hashers.py). New and re-hashed passwords use
+# ALGORITHM at the configured cost; stored hashes made with another algorithm
+# or cost are upgraded transparently on the user's next login. Size the cost
+# with `python manage.py benchmark_auth --concurrency <workers>`.
+PASSWORD_HASHING = {
+    'ALGORITHM': 'pbkdf2_sha256',  # pbkdf2_sha256, scrypt, argon2 (argon2-cffi) or bcrypt_sha256 (bcrypt)
+    'PBKDF2_ITERATIONS': 1_000_000,
+    'SCRYPT_WORK_FACTOR': 2 ** 14,
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 102400,
+    'BCRYPT_ROUNDS': 12,
+}
+
+_PASSWORD_HASHER_CLASSES = {
+    'pbkdf2_sha256': 'tower.hashers.TunablePBKDF2PasswordHasher',
+    'scrypt': 'tower.hashers.TunableScryptPasswordHasher',
+    'argon2': 'tower.hashers.TunableArgon2PasswordHasher',
+    'bcrypt_sha256': 'tower.hashers.TunableBCryptSHA256PasswordHasher',
+}
+# The preferred hasher first; the others only verify (and upgrade) old hashes
+PASSWORD_HASHERS = [_PASSWORD_HASHER_CLASSES[PASSWORD_HASHING['ALGORITHM']]] + [
+    path for name, path in _PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHING['ALGORITHM']
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
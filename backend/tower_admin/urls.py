@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from tower.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('tower.urls')),
+    path('metrics', metrics_view),
 ]
@@ -322,6 +322,8 @@ angular.module('towerAdminApp', ['ngRoute', 'ngResource'])
   
   // Load user info if authenticated
   if (AuthService.isAuthenticated()) {
+    // Keep the session sliding across page reloads instead of signing in again
+    AuthService.scheduleRefresh();
     AuthService.getUserInfo().then(function(user) {
       $rootScope.currentUser = user;
     });
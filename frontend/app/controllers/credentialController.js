@@ -1,5 +1,5 @@
 angular.module('towerAdminApp')
-.controller('CredentialController', function($scope, $http) {
+.controller('CredentialController', function($scope, $http, apiService) {
 
     $scope.credentials = [];
     $scope.newCredential = {};
@@ -9,9 +9,9 @@ angular.module('towerAdminApp')
     // Load credentials from backend API
     $scope.loadCredentials = function() {
         // Load from Django backend
-        $http.get('http://localhost:8001/api/credentials/')
-            .then(function(response) {
-                $scope.credentials = response.data;
+        apiService.listAll('http://localhost:8001/api/credentials/?page_size=1000')
+            .then(function(credentials) {
+                $scope.credentials = credentials;
             })
             .catch(function(error) {
                 console.error('Error loading credentials from backend:', error);
@@ -27,9 +27,9 @@ angular.module('towerAdminApp')
 
     // Load Instance Count with Error Handling
     const loadInstanceCount = function() {
-        $http.get('http://localhost:8001/api/instances/')
+        $http.get('http://localhost:8001/api/instances/?count=1&page_size=1')
             .then(function(response) {
-                $scope.instanceCount = response.data.length;
+                $scope.instanceCount = response.data.count;
             })
             .catch(function(error) {
                 console.error('Error loading instances:', error);
@@ -39,9 +39,9 @@ angular.module('towerAdminApp')
 
     // Load Credential Count with Error Handling  
     const loadCredentialCount = function() {
-        $http.get('http://localhost:8001/api/credentials/')
+        $http.get('http://localhost:8001/api/credentials/?count=1&page_size=1')
             .then(function(response) {
-                $scope.credentialCount = response.data.length;
+                $scope.credentialCount = response.data.count;
             })
             .catch(function(error) {
                 console.error('Error loading credentials:', error);
@@ -51,9 +51,9 @@ angular.module('towerAdminApp')
 
     // Load Environment Count with Error Handling
     const loadEnvironmentCount = function() {
-        $http.get('http://localhost:8001/api/environments/')
+        $http.get('http://localhost:8001/api/environments/?count=1&page_size=1')
             .then(function(response) {
-                $scope.environmentCount = response.data.length;
+                $scope.environmentCount = response.data.count;
             })
             .catch(function(error) {
                 console.error('Error loading environments:', error);
@@ -66,15 +66,15 @@ angular.module('towerAdminApp')
         $scope.loadingCounts = true;
         
         const promises = [
-            $http.get('http://localhost:8001/api/instances/').catch(() => ({ data: [] })),
-            $http.get('http://localhost:8001/api/credentials/').catch(() => ({ data: [] })),
-            $http.get('http://localhost:8001/api/environments/').catch(() => ({ data: [] }))
+            $http.get('http://localhost:8001/api/instances/?count=1&page_size=1').catch(() => ({ data: {} })),
+            $http.get('http://localhost:8001/api/credentials/?count=1&page_size=1').catch(() => ({ data: {} })),
+            $http.get('http://localhost:8001/api/environments/?count=1&page_size=1').catch(() => ({ data: {} }))
         ];
 
         $q.all(promises).then(function(responses) {
-            $scope.instanceCount = responses[0].data.length || 0;
-            $scope.credentialCount = responses[1].data.length || 0;
-            $scope.environmentCount = responses[2].data.length || 0;
+            $scope.instanceCount = responses[0].data.count || 0;
+            $scope.credentialCount = responses[1].data.count || 0;
+            $scope.environmentCount = responses[2].data.count || 0;
             $scope.loadingCounts = false;
         }).catch(function(error) {
             console.error('Error loading counts:', error);
@@ -1,5 +1,5 @@
 angular.module('towerAdminApp')
-.controller('EnvironmentController', function($scope, $http) {
+.controller('EnvironmentController', function($scope, $http, apiService) {
 
     $scope.environments = [];
     $scope.instances = [];
@@ -7,9 +7,9 @@ angular.module('towerAdminApp')
 
     // Load environment data
     $scope.loadEnvironments = function() {
-        $http.get('http://localhost:8001/api/environments/')
-            .then(function(response) {
-                $scope.environments = response.data;
+        apiService.listAll('http://localhost:8001/api/environments/?page_size=1000')
+            .then(function(environments) {
+                $scope.environments = environments;
             })
             .catch(function(error) {
                 console.error('Error loading environments:', error);
@@ -19,9 +19,9 @@ angular.module('towerAdminApp')
 
     // Load instances for dropdown
     $scope.loadInstances = function() {
-        $http.get('http://localhost:8001/api/instances/')
-            .then(function(response) {
-                $scope.instances = response.data;
+        apiService.listAll('http://localhost:8001/api/instances/?page_size=1000')
+            .then(function(instances) {
+                $scope.instances = instances;
             })
             .catch(function(error) {
                 console.error('Error loading instances:', error);
@@ -31,9 +31,9 @@ angular.module('towerAdminApp')
 
     // Load environments from API
     $scope.loadEnvironments = function() {
-        $http.get('http://localhost:8001/api/environments/')
-            .then(function(response) {
-                $scope.environments = response.data;
+        apiService.listAll('http://localhost:8001/api/environments/?page_size=1000')
+            .then(function(environments) {
+                $scope.environments = environments;
             })
             .catch(function(error) {
                 console.error('Error loading environments:', error);
@@ -1,5 +1,5 @@
 angular.module('towerAdminApp')
-.controller('InstanceController', function($scope, $http) {
+.controller('InstanceController', function($scope, $http, apiService) {
 
     $scope.instances = [];
     $scope.newInstance = {};
@@ -12,9 +12,9 @@ angular.module('towerAdminApp')
 
     // Load instances from API
     $scope.loadInstances = function() {
-        $http.get('http://localhost:8001/api/instances/')
-            .then(function(response) {
-                $scope.instances = response.data;
+        apiService.listAll('http://localhost:8001/api/instances/?page_size=1000')
+            .then(function(instances) {
+                $scope.instances = instances;
                 $scope.updateUniqueValues();
             })
             .catch(function(error) {
@@ -3,6 +3,22 @@ angular.module('towerAdminApp')
     return {
         getExample: function() {
             return $http.get('/api/example');
+        },
+
+        // Resolves with every row of a cursor-paginated list, following 'next' until it is null
+        listAll: function(url) {
+            var rows = [];
+            function fetchPage(pageUrl) {
+                return $http.get(pageUrl).then(function(response) {
+                    var data = response.data;
+                    if (!data || !Array.isArray(data.results)) {
+                        return data; // not paginated
+                    }
+                    rows = rows.concat(data.results);
+                    return data.next ? fetchPage(data.next) : rows;
+                });
+            }
+            return fetchPage(url);
         }
     };
 });
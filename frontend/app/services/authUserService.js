@@ -1,24 +1,86 @@
 angular.module('towerAdminApp')
 
-.factory('AuthService', function($http, $window, $location) {
+.factory('AuthService', function($http, $window, $location, $timeout, $q) {
     const API_BASE = 'http://localhost:8001/api/';
-    
+    // Refresh this long before the access token expires
+    const REFRESH_AHEAD_MS = 60 * 1000;
+    let refreshTimer = null;
+    let pendingRefresh = null;
+
+    function storeTokens(data) {
+        $window.localStorage.setItem('access_token', data.access);
+        if (data.refresh) {
+            $window.localStorage.setItem('refresh_token', data.refresh);
+        }
+        $window.localStorage.setItem('user_info', JSON.stringify(data.user));
+    }
+
+    function tokenExpiry(token) {
+        try {
+            const payload = token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/');
+            return JSON.parse($window.atob(payload)).exp * 1000;
+        } catch (e) {
+            return null;
+        }
+    }
+
     return {
         login: function(credentials) {
             return $http.post(API_BASE + 'login/', credentials)
                 .then(function(response) {
                     if (response.data.access) {
                         // Store tokens in localStorage
-                        $window.localStorage.setItem('access_token', response.data.access);
-                        $window.localStorage.setItem('refresh_token', response.data.refresh);
-                        $window.localStorage.setItem('user_info', JSON.stringify(response.data.user));
+                        storeTokens(response.data);
+                        this.scheduleRefresh();
                         return response.data;
                     }
                     throw new Error('Login failed');
+                }.bind(this));
+        },
+
+        // Trades the refresh token for a new pair instead of signing in again.
+        // Concurrent callers share one request: the old refresh token is
+        // blacklisted as soon as it has been used once.
+        refresh: function() {
+            const refreshToken = $window.localStorage.getItem('refresh_token');
+            if (!refreshToken) {
+                return $q.reject(new Error('No refresh token'));
+            }
+            if (!pendingRefresh) {
+                pendingRefresh = $http.post(API_BASE + 'refresh/', { refresh: refreshToken })
+                    .then(function(response) {
+                        storeTokens(response.data);
+                        this.scheduleRefresh();
+                        return response.data;
+                    }.bind(this))
+                    .finally(function() {
+                        pendingRefresh = null;
+                    });
+            }
+            return pendingRefresh;
+        },
+
+        // Sliding session: refresh shortly before the access token expires
+        scheduleRefresh: function() {
+            if (refreshTimer) {
+                $timeout.cancel(refreshTimer);
+            }
+            const expiry = tokenExpiry($window.localStorage.getItem('access_token') || '');
+            if (!expiry) {
+                return;
+            }
+            const delay = Math.max(expiry - Date.now() - REFRESH_AHEAD_MS, 0);
+            refreshTimer = $timeout(function() {
+                this.refresh().catch(function() {
+                    // The 401 handler signs the user out on the next request
                 });
+            }.bind(this), delay, false);
         },
         
         logout: function() {
+            if (refreshTimer) {
+                $timeout.cancel(refreshTimer);
+            }
             const refreshToken = $window.localStorage.getItem('refresh_token');
             const logoutPromise = $http.post(API_BASE + 'logout/', {
                 refresh: refreshToken
@@ -68,11 +130,11 @@ angular.module('towerAdminApp')
     };
 })
 
-.factory('UserService', function($http) {
+.factory('UserService', function($http, apiService) {
     const base = 'http://localhost:8001/api/users/';
     return {
         list: function() {
-            return $http.get(base).then(function(r) { return r.data; });
+            return apiService.listAll(base + '?page_size=1000');
         },
         create: function(user) {
             return $http.post(base, user).then(function(r) { return r.data; });
@@ -87,7 +149,11 @@ angular.module('towerAdminApp')
 })
 
 // HTTP Interceptor to add Authorization header
-.factory('AuthInterceptor', function($window, $location) {
+.factory('AuthInterceptor', function($window, $location, $injector, $q) {
+    function isAuthCall(config) {
+        return /\/(login|refresh|logout)\/$/.test(config.url);
+    }
+
     return {
         request: function(config) {
             const token = $window.localStorage.getItem('access_token');
@@ -97,6 +163,18 @@ angular.module('towerAdminApp')
             return config;
         },
         responseError: function(response) {
+            const config = response.config || {};
+            if (response.status === 401 && !config._retried && !isAuthCall(config)
+                    && $window.localStorage.getItem('refresh_token')) {
+                // Expired or revoked access token: refresh once and replay the request
+                config._retried = true;
+                return $injector.get('AuthService').refresh().then(function() {
+                    return $injector.get('$http')(config);
+                }, function() {
+                    // A rejected refresh has already signed the user out below
+                    return $q.reject(response);
+                });
+            }
             if (response.status === 401) {
                 // Token expired or invalid, redirect to login
                 $window.localStorage.removeItem('access_token');